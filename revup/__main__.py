@@ -12,6 +12,20 @@ from revup.types import (
 )
 
 
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Use uvloop for the event loop if it is installed, since revup spends most of its time waiting
+    on subprocesses and network requests.
+    """
+    try:
+        import uvloop  # type: ignore
+    except ImportError:
+        return asyncio.get_event_loop()
+    loop = uvloop.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
 def _main() -> None:
     try:
         # Exit code of 1 is reserved for exception-based exits.
@@ -19,7 +33,7 @@ def _main() -> None:
         # https://stackoverflow.com/questions/63860576/asyncio-event-loop-is-closed-when-using-asyncio-run
         # Since revup makes use of subprocess, we can't use WindowsSelectorEventLoopPolicy.
         # Instead, we can manually create the event loop and prevent the RuntimeError on shutdown.
-        sys.exit(asyncio.get_event_loop().run_until_complete(main()))
+        sys.exit(get_event_loop().run_until_complete(main()))
     except RevupUsageException as e:
         logging.error(str(e))
         sys.exit(2)
@@ -86,9 +86,7 @@ async def main(args: argparse.Namespace, git_ctx: git.Git) -> int:
     if not first_commit:
         raise RevupUsageException(f"No commits found on {branch_to_pick} relative to {base_branch}")
 
-    commit_info = git.parse_rev_list(
-        await git_ctx.git_stdout("rev-list", "--header", first_commit, "--not", first_commit + "~"),
-    )[0]
+    commit_info = (await git_ctx.get_commits([first_commit]))[0]
     commit_info.tree = GitTreeHash(branch_to_pick + "^{tree}")
     commit_info.parents = [GitCommitHash(parent)]
 
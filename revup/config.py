@@ -5,12 +5,35 @@ import logging
 import os
 import re
 from argparse import _StoreAction, _StoreFalseAction, _StoreTrueAction
-from typing import Any, Dict, List, Optional
+from typing import IO, Any, Callable, Dict, List, Optional
 
 from revup.types import RevupUsageException
 
 
 class RevupArgParser(argparse.ArgumentParser):
+    # If set, called to add this parser's arguments the first time it parses anything. This lets
+    # parsers for commands that aren't being run skip setting up their arguments.
+    lazy_add_arguments: Optional[Callable[["RevupArgParser"], None]] = None
+
+    # If set, config to apply as defaults the first time this parser parses anything, so that
+    # config is only applied to commands that actually run.
+    lazy_config: Optional[configparser.ConfigParser] = None
+
+    def set_lazy_add_arguments(self, add_arguments: Callable[["RevupArgParser"], None]) -> None:
+        """
+        Defer adding this parser's arguments until it first parses anything.
+        """
+        self.lazy_add_arguments = add_arguments
+
+    def parse_known_args(self, *args: Any, **kwargs: Any) -> Any:
+        if self.lazy_add_arguments is not None:
+            add_arguments, self.lazy_add_arguments = self.lazy_add_arguments, None
+            add_arguments(self)
+        if self.lazy_config is not None:
+            conf, self.lazy_config = self.lazy_config, None
+            self.set_defaults_from_config(conf)
+        return super().parse_known_args(*args, **kwargs)
+
     def add_argument(self, *args: Any, **kwargs: Any) -> argparse.Action:
         """
         For each boolean store_true action, add a corresponding "no" store_false action
@@ -99,10 +122,17 @@ class Config:
         self.config_path = config_path
         self.repo_config_path = repo_config_path
 
-    def read(self) -> None:
+    def read(self, config_file: Optional[IO[str]] = None) -> None:
+        """
+        Read the repo config and then the user config, which takes precedence. If the user config
+        has already been opened it can be given as config_file, otherwise it's read from
+        config_path.
+        """
         if self.repo_config_path:
             self.config.read(self.repo_config_path)
-        if self.config_path:
+        if config_file is not None:
+            self.config.read_file(config_file, self.config_path)
+        elif self.config_path:
             self.config.read(self.config_path)
 
     def write(self) -> None:
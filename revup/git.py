@@ -1,11 +1,13 @@
 import asyncio
 import copy
+import hashlib
 import logging
 import os
 import re
 import shutil
 import tempfile
-from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Tuple
+from asyncio.subprocess import Process
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 from async_lru import alru_cache as lru_cache
 
@@ -19,19 +21,6 @@ from revup.types import (
     RevupUsageException,
 )
 
-RE_RAW_COMMIT_ID = re.compile(r"^(?P<commit>[a-f0-9]+)$", re.MULTILINE)
-RE_RAW_AUTHOR = re.compile(
-    r"^author (?P<author>(?P<name>[^<]+?) <(?P<email>[^>]+)> (?P<date>[0-9]+ [+-][0-9]+))$",
-    re.MULTILINE,
-)
-RE_RAW_COMMITTER = re.compile(
-    r"^committer (?P<author>(?P<name>[^<]+?) <(?P<email>[^>]+)> (?P<date>[0-9]+ [+-][0-9]+))$",
-    re.MULTILINE,
-)
-RE_RAW_PARENT = re.compile(r"^parent (?P<commit>[a-f0-9]+)$", re.MULTILINE)
-RE_RAW_TREE = re.compile(r"^tree (?P<tree>.+)$", re.MULTILINE)
-RE_RAW_COMMIT_MSG_LINE = re.compile(r"^    (?P<line>.*)$", re.MULTILINE)
-
 RE_LS_FILES_LINE = re.compile(
     r"^[0-9]+ (?P<hash>[0-9a-f]+) (?P<stage>[0-9])\t(?P<path>.*)$", re.MULTILINE
 )
@@ -70,22 +59,36 @@ GitHubRepoInfo = NamedTuple(
 
 
 def parse_commit_header(raw_header: str) -> CommitHeader:
-    def _search_group(raw_header: str, regex: Pattern[str], group: str) -> str:
-        m = regex.search(raw_header)
-        assert m
-        return m.group(group)
-
-    tree = GitTreeHash(_search_group(raw_header, RE_RAW_TREE, "tree"))
-    title = _search_group(raw_header, RE_RAW_COMMIT_MSG_LINE, "line")
-    commit_id = GitCommitHash(_search_group(raw_header, RE_RAW_COMMIT_ID, "commit"))
-    parents = [GitCommitHash(m.group("commit")) for m in RE_RAW_PARENT.finditer(raw_header)]
-    author_name = _search_group(raw_header, RE_RAW_AUTHOR, "name")
-    author_email = _search_group(raw_header, RE_RAW_AUTHOR, "email")
-    author_date = _search_group(raw_header, RE_RAW_AUTHOR, "date")
-    committer_name = _search_group(raw_header, RE_RAW_COMMITTER, "name")
-    committer_email = _search_group(raw_header, RE_RAW_COMMITTER, "email")
-    committer_date = _search_group(raw_header, RE_RAW_COMMITTER, "date")
-    commit_msg = "\n".join(m.group("line") for m in RE_RAW_COMMIT_MSG_LINE.finditer(raw_header))
+    """
+    Parses a single entry of `git rev-list --header` output. The headers and message are split
+    once, then each header line is dispatched on its keyword in a single pass.
+    """
+    headers, _, msg = raw_header.partition("\n\n")
+    header_lines = headers.split("\n")
+    commit_id = GitCommitHash(header_lines[0])
+    tree = GitTreeHash("")
+    parents: List[GitCommitHash] = []
+    author = committer = ""
+    for line in header_lines[1:]:
+        keyword, _, value = line.partition(" ")
+        if keyword == "tree":
+            tree = GitTreeHash(value)
+        elif keyword == "parent":
+            parents.append(GitCommitHash(value))
+        elif keyword == "author":
+            author = value
+        elif keyword == "committer":
+            committer = value
+    assert tree and author and committer
+
+    # Identity lines look like "name <email> date tz"
+    author_name, _, author_email = author.partition(" <")
+    author_email, _, author_date = author_email.partition("> ")
+    committer_name, _, committer_email = committer.partition(" <")
+    committer_email, _, committer_date = committer_email.partition("> ")
+
+    # Message lines are indented by 4 spaces
+    msg_lines = [line[4:] for line in msg.split("\n") if line.startswith("    ")]
     return CommitHeader(
         tree,
         parents,
@@ -95,12 +98,44 @@ def parse_commit_header(raw_header: str) -> CommitHeader:
         committer_name,
         committer_email,
         committer_date,
-        commit_msg,
-        title,
+        "\n".join(msg_lines),
+        msg_lines[0] if msg_lines else "",
         commit_id,
     )
 
 
+def parse_commit_object(commit_id: str, raw_object: str) -> CommitHeader:
+    """
+    Parses a raw commit object as output by cat-file, by first formatting it like rev-list --header
+    does: leading and trailing blank lines and trailing whitespace are removed from the message,
+    and its lines are indented.
+    """
+    headers, _, msg = raw_object.partition("\n\n")
+    msg = "\n".join(line.rstrip() for line in msg.split("\n")).strip("\n")
+    return parse_commit_header(
+        "{}\n{}\n\n{}".format(
+            commit_id, headers, "\n".join(f"    {line}" for line in msg.split("\n"))
+        )
+    )
+
+
+def decode_commit_object(raw_object: bytes) -> str:
+    """
+    Decodes a raw commit object using the encoding named in its header, defaulting to utf-8 like
+    git does. Any undecodable bytes are replaced rather than failing.
+    """
+    encoding = "utf-8"
+    for line in raw_object.partition(b"\n\n")[0].split(b"\n"):
+        if line.startswith(b"encoding "):
+            encoding = line[len(b"encoding ") :].decode(errors="replace")
+            break
+    try:
+        return raw_object.decode(encoding, errors="replace")
+    except LookupError:
+        # An encoding python doesn't know
+        return raw_object.decode(errors="replace")
+
+
 def parse_rev_list(s: str) -> List[CommitHeader]:
     """
     Parses output of rev-list -v and returns a list of commits
@@ -136,6 +171,18 @@ def get_default_git() -> str:
     return ret
 
 
+async def get_repo_dirs(sh: shell.Shell, git_path: str) -> Tuple[str, str]:
+    """
+    Return the root of the working tree and the absolute path of the git dir, using a single
+    rev-parse for both.
+    """
+    _, out = await sh.sh(
+        git_path, "rev-parse", "--show-toplevel", "--path-format=absolute", "--git-dir"
+    )
+    repo_root, git_dir = out.rstrip().split("\n")
+    return repo_root, git_dir
+
+
 async def make_git(
     sh: shell.Shell,
     git_path: str = "",
@@ -145,7 +192,12 @@ async def make_git(
     base_branch_globs: str = "",
     keep_temp: bool = False,
     editor: str = "",
+    repo_dirs: Optional[Tuple[str, str]] = None,
 ) -> "Git":
+    """
+    Create a Git object and query the information it needs about the repo. repo_dirs can be
+    given if get_repo_dirs() has already been called.
+    """
     if not git_path:
         git_path = get_default_git()
 
@@ -167,9 +219,13 @@ async def make_git(
             ret = os.environ.get("GIT_EDITOR", os.environ.get("EDITOR", "nano"))
         return ret
 
-    repo_root, git_dir, actual_version, email, editor, main_exists = await asyncio.gather(
-        git_ctx.git_stdout("rev-parse", "--show-toplevel"),
-        git_ctx.git_stdout("rev-parse", "--path-format=absolute", "--git-dir"),
+    async def get_dirs() -> Tuple[str, str]:
+        if repo_dirs is not None:
+            return repo_dirs
+        return await get_repo_dirs(sh, git_path)
+
+    (repo_root, git_dir), actual_version, email, editor, main_exists = await asyncio.gather(
+        get_dirs(),
         git_ctx.git_stdout("--version"),
         get_email(),
         get_editor(),
@@ -234,6 +290,11 @@ class Git:
     author: str
     editor: str
 
+    # Long running "git cat-file --batch" process used to look up objects without spawning a new
+    # git process each time. Started lazily on first use.
+    cat_file_proc: Optional[Process] = None
+    cat_file_lock: Optional[asyncio.Lock] = None
+
     def __init__(
         self,
         sh: shell.Shell,
@@ -265,7 +326,7 @@ class Git:
         self.to_commit_hash.cache_clear()  # pylint: disable=no-member
         self.fork_point.cache_clear()  # pylint: disable=no-member
         self.distance_to_fork_point.cache_clear()  # pylint: disable=no-member
-        self.have_identical_trees.cache_clear()  # pylint: disable=no-member
+        self._get_best_base_branch_candidates.cache_clear()  # pylint: disable=no-member
 
     def get_scratch_dir(self) -> str:
         """
@@ -305,6 +366,68 @@ class Git:
     async def git_stdout(self, *args: str, **kwargs: Any) -> str:
         return (await self.git(*args, **kwargs))[1]
 
+    async def cat_file(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        """
+        Look up the object named by spec, which can be any revision expression understood by
+        rev-parse. Returns a tuple of the object's hash, type, and contents, or None if it doesn't
+        exist. All lookups share a single cat-file process.
+        """
+        return (await self.cat_files([spec]))[0]
+
+    async def cat_files(self, specs: Sequence[str]) -> List[Optional[Tuple[str, str, bytes]]]:
+        """
+        Look up several objects as in cat_file(). All the requests are sent before reading any of
+        the results, so the whole batch only costs a single round trip to the cat-file process.
+        """
+        if self.cat_file_lock is None:
+            self.cat_file_lock = asyncio.Lock()
+
+        async with self.cat_file_lock:
+            if self.cat_file_proc is None:
+                # The default format, spelled out since the parsing below depends on it
+                cat_file_args = ["cat-file", "--batch=%(objectname) %(objecttype) %(objectsize)"]
+                if not self.sh.quiet:
+                    shell.log_command([self.git_path, *cat_file_args])
+                self.cat_file_proc = await asyncio.create_subprocess_exec(
+                    self.git_path,
+                    *cat_file_args,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    # Like rev-parse --quiet, invalid names are reported through the return value
+                    stderr=asyncio.subprocess.DEVNULL,
+                    cwd=self.sh.cwd,
+                )
+            assert self.cat_file_proc.stdin and self.cat_file_proc.stdout
+
+            # The batch protocol is line based, so a spec with a newline can't name a valid object
+            to_send = [spec for spec in specs if "\n" not in spec]
+            self.cat_file_proc.stdin.write("".join(f"{spec}\n" for spec in to_send).encode())
+            await self.cat_file_proc.stdin.drain()
+
+            found: Dict[str, Optional[Tuple[str, str, bytes]]] = {}
+            for spec in to_send:
+                # Output is "<hash> <type> <size>\n<contents>\n", or "<spec> missing\n" (or
+                # "ambiguous") if the object couldn't be found. The spec can contain spaces, so
+                # only a numeric size means the object was found.
+                line = await self.cat_file_proc.stdout.readuntil()
+                header = line.decode(errors="replace").rstrip("\n").rsplit(" ", 2)
+                if len(header) != 3 or not header[2].isdigit():
+                    found[spec] = None
+                    continue
+                contents = await self.cat_file_proc.stdout.readexactly(int(header[2]) + 1)
+                found[spec] = (header[0], header[1], contents[:-1])
+            return [found.get(spec) for spec in specs]
+
+    async def close(self) -> None:
+        """
+        Stop the cat-file process if it was started.
+        """
+        if self.cat_file_proc is not None:
+            assert self.cat_file_proc.stdin
+            self.cat_file_proc.stdin.close()
+            await self.cat_file_proc.wait()
+            self.cat_file_proc = None
+
     async def get_github_repo_info(self, github_url: str, remote_name: str) -> GitHubRepoInfo:
         """
         Return github repo's name and owner.
@@ -361,23 +484,42 @@ class Git:
 
     @lru_cache(maxsize=None)
     async def is_branch_or_commit(self, obj: str) -> bool:
-        return (
-            await self.git_return_code("rev-parse", "--verify", "--quiet", obj + "^{commit}") == 0
-        )
+        return await self.cat_file(obj + "^{commit}") is not None
 
     async def verify_branch_or_commit(self, obj: str) -> None:
         if not await self.is_branch_or_commit(obj):
             raise RevupUsageException(f"{obj} is not a commit or branch name!")
 
+    async def verify_branches_or_commits(self, objs: Sequence[str]) -> List[GitCommitHash]:
+        """
+        Verify several branches or commits with a single batch lookup, and return their commit
+        hashes.
+        """
+        ret = []
+        for obj, found in zip(objs, await self.cat_files([f"{obj}^{{commit}}" for obj in objs])):
+            if found is None:
+                raise RevupUsageException(f"{obj} is not a commit or branch name!")
+            ret.append(GitCommitHash(found[0]))
+        return ret
+
+    async def get_commits(self, objs: Sequence[str]) -> List[CommitHeader]:
+        """
+        Verify several branches or commits and read their commits with a single batch lookup.
+        """
+        ret = []
+        for obj, found in zip(objs, await self.cat_files([f"{obj}^{{commit}}" for obj in objs])):
+            if found is None:
+                raise RevupUsageException(f"{obj} is not a commit or branch name!")
+            ret.append(parse_commit_object(found[0], decode_commit_object(found[2])))
+        return ret
+
     @lru_cache(maxsize=None)
     async def to_commit_hash(self, ref: str) -> GitCommitHash:
-        ret, stdout = await self.git(
-            "rev-parse", "--verify", "--quiet", ref + "^{commit}", raiseonerror=False
-        )
-        if ret != 0:
+        obj = await self.cat_file(ref + "^{commit}")
+        if obj is None:
             raise RevupUsageException(f"{ref} is not a branch name!")
 
-        return GitCommitHash(stdout)
+        return GitCommitHash(obj[0])
 
     @lru_cache(maxsize=None)
     async def fork_point(self, ref: str, baseRef: str) -> GitCommitHash:
@@ -437,16 +579,6 @@ class Git:
             return True
         return await self.distance_to_fork_point(ref, ancestor, 1) == 0
 
-    @lru_cache(maxsize=None)
-    async def have_identical_trees(self, ref1: GitCommitHash, ref2: GitCommitHash) -> bool:
-        """
-        Return whether two commit-ish have the same trees, which indicate that
-        they have no diff.
-        """
-        tree1 = await self.git_stdout("rev-parse", f"{ref1}^{{tree}}")
-        tree2 = await self.git_stdout("rev-parse", f"{ref2}^{{tree}}")
-        return tree1 == tree2
-
     def ensure_branch_prefix(self, branch: str) -> str:
         """
         Ensure the branch is prefixed with the remote name.
@@ -503,32 +635,45 @@ class Git:
 
     async def get_best_base_branch_candidates(
         self, commit: str, limit_to_base_branches: bool = True, allow_self: bool = True
-    ) -> List[str]:
+    ) -> Tuple[str, ...]:
         """
         Find the best base branch for the given commit by listing candidate remote branches
         Return the branch(es) with the shortest distance from the commit to fork-point
         """
+        # The result is cached on the commit hash rather than the name, so that a ref that moves
+        # isn't answered from a stale entry
+        (commit_hash,) = await self.verify_branches_or_commits([commit])
+        return await self._get_best_base_branch_candidates(
+            commit_hash, limit_to_base_branches, "" if allow_self else commit
+        )
+
+    @lru_cache(maxsize=None)
+    async def _get_best_base_branch_candidates(
+        self, commit: GitCommitHash, limit_to_base_branches: bool, excluded_branch: str
+    ) -> Tuple[str, ...]:
+        """
+        Implements get_best_base_branch_candidates(), never returning excluded_branch unless it is
+        the only candidate. Returns a tuple so the cached result can't be modified by callers.
+        """
         branches = await self.find_remote_branches(commit, limit_to_base_branches, True)
-        candidates: List[Tuple[int, str]] = []
 
         if len(branches) == 1:
-            return branches
-
-        for b in branches:
-            if not allow_self and b == commit:
-                continue
-
-            # If we have valid candidates, we can stop iterating once the distance is greater
-            # than the current best distance.
-            dist = await self.distance_to_fork_point(
-                commit, b, candidates[0][0] if candidates else 0
+            return tuple(branches)
+
+        branches = [b for b in branches if b != excluded_branch]
+        if not branches:
+            return ()
+
+        # The distance to the first branch bounds how far the others need to be walked, since
+        # anything further can't be a candidate. The rest can then be measured concurrently.
+        best = await self.distance_to_fork_point(commit, branches[0])
+        dists = [best] + list(
+            await asyncio.gather(
+                *(self.distance_to_fork_point(commit, b, best) for b in branches[1:])
             )
-
-            if len(candidates) == 0 or candidates[0][0] > dist:
-                candidates = [(dist, b)]
-            elif candidates[0][0] == dist:
-                candidates.append((dist, b))
-        return [c[1] for c in candidates]
+        )
+        best = min(dists)
+        return tuple(b for b, dist in zip(branches, dists) if dist == best)
 
     async def get_best_base_branch(
         self,
@@ -577,34 +722,92 @@ class Git:
         ret = await self.git_stdout(*commit_tree_args, env=git_env)
         return GitCommitHash(ret)
 
-    async def get_patch_id(
-        self,
-        commit: GitCommitHash,
-    ) -> str:
+    async def get_patch_ids(self, commits: Sequence[GitCommitHash]) -> List[str]:
         """
-        Return a patch-id that uniquely identifies this commit's diff (but not its other metadata).
+        Return a patch-id for each commit that uniquely identifies its diff (but not its other
+        metadata), computed with a single log and patch-id pipeline for all of them. Commits must be
+        given as full hashes.
         """
+        if not commits:
+            return []
         patch_source = (
             [
                 self.git_path,
+                "--no-pager",
+                "log",
+                "--stdin",
+                "--no-walk",
+                "--format=commit %H",
+                "--no-show-signature",
+                "--diff-merges=first-parent",
+                "-p",
             ]
-            + GIT_DIFF_ARGS
-            + [
-                commit + "~",
-                commit,
-            ]
+            # Skip the "--no-pager diff" from the usual diff args
+            + GIT_DIFF_ARGS[2:]
         )
-        ret = (
+        out = (
             await self.sh.piped_sh(
                 patch_source,
                 [self.git_path, "patch-id", "--verbatim"],
                 env1=GIT_ENV_NOCONFIG,
                 env2=GIT_ENV_NOCONFIG,
+                input_str="".join(f"{commit}\n" for commit in commits),
             )
-        )[1].split()
-        # If the diff is empty, patch id will return nothing. We just use that as the patch-id since
-        # it fulfills the requirement of matching other empty diffs.
-        return ret[0] if ret else ""
+        )[1]
+        # Each line is "<patch-id> <commit>". Commits with empty diffs are missing, and get an empty
+        # patch-id since it fulfills the requirement of matching other empty diffs.
+        patch_ids = {}
+        for line in out.splitlines():
+            patch_id, _, commit = line.partition(" ")
+            patch_ids[commit] = patch_id
+        return [patch_ids.get(commit, "") for commit in commits]
+
+    async def get_diff_fingerprints(self, commits: Sequence[GitCommitHash]) -> List[str]:
+        """
+        Return a fingerprint of each commit's diff against its first parent, including line
+        numbers, computed with a single log for all of them. Blob hashes are left out, so two
+        commits making the same change at the same lines have equal fingerprints even if their
+        parents differ elsewhere. Unlike patch-ids, the same change at different lines gives
+        different fingerprints. Commits must be given as full hashes.
+        """
+        if not commits:
+            return []
+
+        def hash_line(line: bytes) -> bytes:
+            # Diffs can contain any bytes, so lines are hashed rather than decoded. An empty line
+            # marks the end of the output and is passed through.
+            if not line or line.startswith(b"commit "):
+                return line
+            if line.startswith(b"index "):
+                # An empty result would end the output, so leave an empty line instead
+                return b"\n"
+            return hashlib.sha1(line).hexdigest().encode() + b"\n"
+
+        out = await self.git_stdout(
+            "--no-pager",
+            "log",
+            "--stdin",
+            "--no-walk",
+            "--format=commit %H",
+            "--no-show-signature",
+            "--diff-merges=first-parent",
+            "-p",
+            "--binary",
+            # Skip the "--no-pager diff" from the usual diff args
+            *GIT_DIFF_ARGS[2:],
+            input_str="".join(f"{commit}\n" for commit in commits),
+            output_transform=hash_line,
+            no_config=True,
+        )
+        # Hashed lines never start with "commit ", so that always begins the next commit's diff
+        fingerprints: Dict[str, List[str]] = {}
+        lines: List[str] = []
+        for line in out.split("\n"):
+            if line.startswith("commit "):
+                lines = fingerprints.setdefault(line[len("commit ") :], [])
+            elif line:
+                lines.append(line)
+        return [" ".join(fingerprints.get(commit, [])) for commit in commits]
 
     async def get_diff_summary(
         self,
@@ -699,7 +902,10 @@ class Git:
         """
         groups: List[List[int]] = []
         conflict_depth = 0
-        lines = (await self.git_stdout("show", f"{tree}:{path}")).split("\n")
+        obj = await self.cat_file(f"{tree}:{path}")
+        if obj is None:
+            return
+        lines = obj[2].decode(errors="backslashreplace").split("\n")
         for lineno, line in enumerate(lines):
             if line.startswith("<" * 7):
                 if conflict_depth == 0:
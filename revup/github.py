@@ -3,6 +3,9 @@ from typing import Any
 
 
 class GitHubEndpoint(metaclass=ABCMeta):
+    # Url of the github site this endpoint connects to.
+    github_url: str
+
     @abstractmethod
     async def graphql(self, query: str, **kwargs: Any) -> Any:
         """
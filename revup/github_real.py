@@ -1,13 +1,45 @@
 import json
 import logging
 import time
-from typing import Any, Optional, Tuple, Union
+from typing import Any, Callable, Optional, Tuple, Union
 
-from aiohttp import ClientSession, ContentTypeError
+from aiohttp import ClientSession, ContentTypeError, TCPConnector
 
 from revup import github
 from revup.types import RevupGithubException, RevupRequestException
 
+# Responses can be large, so use orjson to decode them if it is installed.
+try:
+    import orjson
+
+    json_loads: Callable[[str], Any] = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Connection pool shared by all endpoints so that sessions to the same host can reuse
+# connections. Created lazily since the connector must be made inside a running event loop.
+_shared_connector: Optional[TCPConnector] = None
+
+
+def get_shared_connector() -> TCPConnector:
+    global _shared_connector  # pylint: disable=global-statement
+    if _shared_connector is None or _shared_connector.closed:
+        _shared_connector = TCPConnector(
+            limit=100, limit_per_host=50, keepalive_timeout=75, ttl_dns_cache=300
+        )
+    return _shared_connector
+
+
+async def close_shared_connector() -> None:
+    """
+    Close the shared connection pool. Endpoints don't own the connector, so this must be
+    called once all endpoints are done.
+    """
+    global _shared_connector  # pylint: disable=global-statement
+    if _shared_connector is not None:
+        await _shared_connector.close()
+        _shared_connector = None
+
 
 class RealGitHubEndpoint(github.GitHubEndpoint):
     """
@@ -54,16 +86,19 @@ class RealGitHubEndpoint(github.GitHubEndpoint):
 
     async def graphql(self, query: str, **kwargs: Any) -> Any:
         if self.session is None:
-            self.session = ClientSession()
+            self.session = ClientSession(connector=get_shared_connector(), connector_owner=False)
 
         start_time = time.time()
         headers = {}
         if self.oauth_token:
             headers["Authorization"] = "bearer {}".format(self.oauth_token)
 
-        logging.debug("# POST {}".format(self.graphql_endpoint))
-        logging.debug("Request GraphQL query:\n{}".format(query))
-        logging.debug("Request GraphQL variables:\n{}".format(json.dumps(kwargs, indent=1)))
+        # Pretty printing large requests and responses is expensive, so only do it when needed
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if debug:
+            logging.debug("# POST {}".format(self.graphql_endpoint))
+            logging.debug("Request GraphQL query:\n{}".format(query))
+            logging.debug("Request GraphQL variables:\n{}".format(json.dumps(kwargs, indent=1)))
 
         async with self.session.post(
             self.graphql_endpoint,
@@ -75,13 +110,14 @@ class RealGitHubEndpoint(github.GitHubEndpoint):
                 "Response status: {} took {}".format(resp.status, time.time() - start_time)
             )
             try:
-                r = await resp.json()
+                r = await resp.json(loads=json_loads)
             except (ValueError, ContentTypeError):
                 logging.warning("Response body:\n{}".format(await resp.text()))
                 raise
             else:
-                pretty_json = json.dumps(r, indent=1)
-                logging.debug("Response JSON:\n{}".format(pretty_json))
+                if debug:
+                    pretty_json = json.dumps(r, indent=1)
+                    logging.debug("Response JSON:\n{}".format(pretty_json))
 
             if "errors" in r:
                 raise RevupGithubException(r["errors"])
@@ -1,7 +1,20 @@
+import asyncio
+import functools
 import logging
 import re
 from dataclasses import dataclass, field
-from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from typing import (
+    Any,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 from revup import github
 from revup.git import GitHubRepoInfo
@@ -9,6 +22,110 @@ from revup.types import GitCommitHash, RevupGithubException
 
 MAX_COMMENTS_TO_QUERY = 3
 
+# Maximum number of each kind of item to query or mutate in a single graphql request. Very large
+# requests can run into github's node and cost limits, so they are split up. Queries are sent
+# concurrently, while mutations are sent one at a time.
+GRAPHQL_BATCH_SIZE = 10
+
+# Maximum number of graphql queries in flight at once.
+GRAPHQL_CONCURRENCY = 4
+
+T = TypeVar("T")
+
+# Repository node ids by (github url, owner, name). These never change, so a query for nothing but
+# the id can be skipped once it is known.
+_repo_id_cache: Dict[Tuple[str, str, str], str] = {}
+
+# Graphql fragments that are appended to the query when the corresponding results are used.
+USER_FRAGMENT = """
+        fragment UserResult on UserConnection {
+            nodes {
+                login
+                id
+            }
+            totalCount
+        }"""
+
+LABEL_FRAGMENT = """
+        fragment LabelResult on Label {
+            id
+            name
+        }"""
+
+# The pr fragment only depends on MAX_COMMENTS_TO_QUERY, so it is formatted once at import.
+PR_FRAGMENT = f"""
+        fragment PrResult on PullRequestConnection {{
+            nodes {{
+                id
+                state
+                url
+                baseRefName
+                body
+                title
+                isDraft
+                baseCommit: commits(first: 1) {{
+                    nodes {{
+                        commit {{
+                            parents (first: 1) {{
+                                nodes {{
+                                    oid
+                                }}
+                            }}
+                        }}
+                    }}
+                }}
+                headCommit: commits(last: 1) {{
+                    nodes {{
+                        commit {{
+                            oid
+                        }}
+                    }}
+                }}
+                reviewRequests (first: 25) {{
+                    nodes {{
+                        requestedReviewer {{
+                            ... on User {{
+                                login
+                                id
+                            }}
+                        }}
+                    }}
+                }}
+                latestReviews (first: 25) {{
+                    nodes {{
+                        author {{
+                            ... on User {{
+                                login
+                                id
+                            }}
+                        }}
+                        viewerDidAuthor
+                    }}
+                }}
+                assignees (first: 25) {{
+                    nodes {{
+                        ... on User {{
+                            login
+                            id
+                        }}
+                    }}
+                }}
+                labels (first: 25) {{
+                    nodes {{
+                        name
+                        id
+                    }}
+                }}
+                comments (first: {MAX_COMMENTS_TO_QUERY}) {{
+                    nodes {{
+                        body
+                        id
+                    }}
+                }}
+            }}
+            totalCount
+        }}"""
+
 
 @dataclass
 class PrComment:
@@ -31,12 +148,10 @@ class PrInfo:
     id: str = ""
     url: str = ""
     state: str = ""
-    reviewers: Set[str] = field(default_factory=set)
-    reviewer_ids: Set[str] = field(default_factory=set)
-    assignees: Set[str] = field(default_factory=set)
-    assignee_ids: Set[str] = field(default_factory=set)
-    labels: Set[str] = field(default_factory=set)
-    label_ids: Set[str] = field(default_factory=set)
+    # Reviewer and assignee logins, and label names, each mapped to their graphql node id
+    reviewers: Dict[str, str] = field(default_factory=dict)
+    assignees: Dict[str, str] = field(default_factory=dict)
+    labels: Dict[str, str] = field(default_factory=dict)
     is_draft: bool = False
     comments: List[PrComment] = field(default_factory=list)
 
@@ -66,7 +181,7 @@ def get_args_dict(args: List[Any], prefix: str) -> Dict[str, Any]:
     return {f"{prefix}{n}": arg for n, arg in enumerate(args)}
 
 
-def get_args_declaration(args: Dict[str, Any], typ: str) -> List[str]:
+def get_args_declaration(args: Iterable[str], typ: str) -> List[str]:
     """
     Return a list of args with their type declaration.
     """
@@ -80,47 +195,34 @@ def get_result_args(num: int, prefix: str) -> List[str]:
     return [f"{prefix}{n}" for n in range(num)]
 
 
-def zip_and_flatten(l1: Iterable[str], l2: Iterable[str]) -> List[str]:
+async def gather_limited(aws: Iterable[Awaitable[T]]) -> List[T]:
     """
-    Return a list of l1 and l2 interleaved.
+    Like asyncio.gather, but with at most GRAPHQL_CONCURRENCY awaitables running at once.
     """
-    ret: List[str] = []
-    iter1 = iter(l1)
-    iter2 = iter(l2)
-    while True:
-        try:
-            ret.append(next(iter1))
-            ret.append(next(iter2))
-        except StopIteration:
-            break
-    return ret
+    semaphore = asyncio.Semaphore(GRAPHQL_CONCURRENCY)
 
+    async def run(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
 
-async def query_everything(
-    github_ep: github.GitHubEndpoint,
-    repo_info: GitHubRepoInfo,
-    head_refs: List[str],
-    user_ids: List[str],
-    labels: List[str],
-) -> Tuple[str, List[Optional[PrInfo]], Dict[str, str], Dict[str, str], Dict[str, str]]:
-    """
-    This function does all necessary graphql querying in one request. This dramatically reduces the
-    amount of time spent on querying.
+    return await asyncio.gather(*(run(aw) for aw in aws))
 
-    Returns a tuple of:
-    - Repository node id
-    - List of pull requests, one for each ref in head_refs. None if a pr wasn't found for that ref
-    - Dict of user_ids as given to graphql node ids
-    - Dict of user_ids as given to their full login name
-    - Dict of labels to their graphql node ids
+
+@functools.lru_cache(maxsize=64)
+def _build_multi_query(
+    n_refs: int, n_users: int, n_labels: int
+) -> Tuple[str, List[str], List[str], List[str]]:
     """
-    head_refs_args = get_args_dict(head_refs, "pr")
-    user_id_args = get_args_dict(user_ids, "user")
-    label_args = get_args_dict(labels, "label")
+    Return the query string used by query_everything along with the result names for prs, users,
+    and labels. The query only depends on the number of each argument, so it is cached.
+    """
+    head_refs_args = get_result_args(n_refs, "pr")
+    user_id_args = get_result_args(n_users, "user")
+    label_args = get_result_args(n_labels, "label")
 
-    prs_out = get_result_args(len(head_refs), "pr_out")
-    user_id_out = get_result_args(len(user_ids), "user_out")
-    label_out = get_result_args(len(labels), "label_out")
+    prs_out = get_result_args(n_refs, "pr_out")
+    user_id_out = get_result_args(n_users, "user_out")
+    label_out = get_result_args(n_labels, "label_out")
 
     arg_str = ", ".join(
         get_args_declaration(head_refs_args, "String!")
@@ -132,120 +234,120 @@ async def query_everything(
     # OPEN prs, followed by MERGED prs in the order that they merged. github doesn't offer these
     # options and it is excessively expensive to always fetch multiple prs and order them on this
     # side. For now we hope that the most relevant PR will have the most recent update time.
-    request_str = "".join(
-        len(head_refs)
-        * [
-            "{}: pullRequests (headRefName: ${}, states: [OPEN, MERGED], first: 1, "
-            "orderBy: {{direction: DESC, field:UPDATED_AT}}) {{"
+    # Skip building the strings for any kind of result that isn't queried at all
+    request_str = (
+        "".join(
+            f"{out}: pullRequests (headRefName: ${arg}, states: [OPEN, MERGED], first: 1, "
+            "orderBy: {direction: DESC, field:UPDATED_AT}) {"
             "...PrResult"
-            "}},"
-        ]
+            "},"
+            for out, arg in zip(prs_out, head_refs_args)
+        )
+        if n_refs
+        else ""
     )
-    request_str = request_str.format(*zip_and_flatten(prs_out, head_refs_args.keys()))
 
-    user_str = "".join(
-        len(user_ids) * ["{}: assignableUsers (query: ${}, first: 25) {{...UserResult}},"]
+    user_str = (
+        "".join(
+            f"{out}: assignableUsers (query: ${arg}, first: 25) {{...UserResult}},"
+            for out, arg in zip(user_id_out, user_id_args)
+        )
+        if n_users
+        else ""
     )
-    user_str = user_str.format(*zip_and_flatten(user_id_out, user_id_args.keys()))
 
-    label_str = "".join(len(labels) * ["{}: label (name: ${}) {{...LabelResult}},"])
-    label_str = label_str.format(*zip_and_flatten(label_out, label_args.keys()))
+    label_str = (
+        "".join(
+            f"{out}: label (name: ${arg}) {{...LabelResult}},"
+            for out, arg in zip(label_out, label_args)
+        )
+        if n_labels
+        else ""
+    )
 
-    multi_query_str = f"""
+    parts = [
+        f"""
         query GetPrResults($owner: String!, $name: String!, {arg_str}) {{
             repository(name: $name, owner: $owner) {{
                 id
                 {request_str}{user_str}{label_str}
             }}
         }}"""
+    ]
     if user_str:
-        multi_query_str += """
-        fragment UserResult on UserConnection {
-            nodes {
-                login
-                id
-            }
-            totalCount
-        }"""
+        parts.append(USER_FRAGMENT)
     if label_str:
-        multi_query_str += """
-        fragment LabelResult on Label {
-            id
-            name
-        }"""
+        parts.append(LABEL_FRAGMENT)
     if request_str:
-        multi_query_str += f"""
-        fragment PrResult on PullRequestConnection {{
-            nodes {{
-                id
-                state
-                url
-                baseRefName
-                body
-                title
-                isDraft
-                baseCommit: commits(first: 1) {{
-                    nodes {{
-                        commit {{
-                            parents (first: 1) {{
-                                nodes {{
-                                    oid
-                                }}
-                            }}
-                        }}
-                    }}
-                }}
-                headCommit: commits(last: 1) {{
-                    nodes {{
-                        commit {{
-                            oid
-                        }}
-                    }}
-                }}
-                reviewRequests (first: 25) {{
-                    nodes {{
-                        requestedReviewer {{
-                            ... on User {{
-                                login
-                                id
-                            }}
-                        }}
-                    }}
-                }}
-                latestReviews (first: 25) {{
-                    nodes {{
-                        author {{
-                            ... on User {{
-                                login
-                                id
-                            }}
-                        }}
-                        viewerDidAuthor
-                    }}
-                }}
-                assignees (first: 25) {{
-                    nodes {{
-                        ... on User {{
-                            login
-                            id
-                        }}
-                    }}
-                }}
-                labels (first: 25) {{
-                    nodes {{
-                        name
-                        id
-                    }}
-                }}
-                comments (first: {MAX_COMMENTS_TO_QUERY}) {{
-                    nodes {{
-                        body
-                        id
-                    }}
-                }}
-            }}
-            totalCount
-        }}"""
+        parts.append(PR_FRAGMENT)
+
+    return "".join(parts), prs_out, user_id_out, label_out
+
+
+async def query_everything(
+    github_ep: github.GitHubEndpoint,
+    repo_info: GitHubRepoInfo,
+    head_refs: List[str],
+    user_ids: List[str],
+    labels: List[str],
+) -> Tuple[str, List[Optional[PrInfo]], Dict[str, str], Dict[str, str], Dict[str, str]]:
+    """
+    This function does all necessary graphql querying in as few requests as possible, which are
+    sent concurrently. This dramatically reduces the amount of time spent on querying.
+
+    Returns a tuple of:
+    - Repository node id
+    - List of pull requests, one for each ref in head_refs. None if a pr wasn't found for that ref
+    - Dict of user_ids as given to graphql node ids
+    - Dict of user_ids as given to their full login name
+    - Dict of labels to their graphql node ids
+    """
+    repo_key = (github_ep.github_url, repo_info.owner, repo_info.name)
+    if not head_refs and not user_ids and not labels and repo_key in _repo_id_cache:
+        return _repo_id_cache[repo_key], [], {}, {}, {}
+
+    results = await gather_limited(
+        query_everything_batch(
+            github_ep,
+            repo_info,
+            head_refs[i : i + GRAPHQL_BATCH_SIZE],
+            user_ids[i : i + GRAPHQL_BATCH_SIZE],
+            labels[i : i + GRAPHQL_BATCH_SIZE],
+        )
+        for i in range(0, max(len(head_refs), len(user_ids), len(labels), 1), GRAPHQL_BATCH_SIZE)
+    )
+
+    prs: List[Optional[PrInfo]] = []
+    names_to_ids: Dict[str, str] = {}
+    names_to_logins: Dict[str, str] = {}
+    labels_to_ids: Dict[str, str] = {}
+    for _, batch_prs, batch_names_to_ids, batch_names_to_logins, batch_labels_to_ids in results:
+        prs.extend(batch_prs)
+        names_to_ids.update(batch_names_to_ids)
+        names_to_logins.update(batch_names_to_logins)
+        labels_to_ids.update(batch_labels_to_ids)
+
+    _repo_id_cache[repo_key] = results[0][0]
+    return results[0][0], prs, names_to_ids, names_to_logins, labels_to_ids
+
+
+async def query_everything_batch(
+    github_ep: github.GitHubEndpoint,
+    repo_info: GitHubRepoInfo,
+    head_refs: List[str],
+    user_ids: List[str],
+    labels: List[str],
+) -> Tuple[str, List[Optional[PrInfo]], Dict[str, str], Dict[str, str], Dict[str, str]]:
+    """
+    Query a single batch of query_everything() in one request. Returns the same tuple.
+    """
+    head_refs_args = get_args_dict(head_refs, "pr")
+    user_id_args = get_args_dict(user_ids, "user")
+    label_args = get_args_dict(labels, "label")
+
+    multi_query_str, prs_out, user_id_out, label_out = _build_multi_query(
+        len(head_refs), len(user_ids), len(labels)
+    )
 
     pr_result = await github_ep.graphql(
         multi_query_str,
@@ -256,34 +358,25 @@ async def query_everything(
         **label_args,
     )
 
+    repo_data = pr_result["data"]["repository"]
     prs: List[Optional[PrInfo]] = []
     for i, branch_name in enumerate(head_refs):
-        this_node = pr_result["data"]["repository"][prs_out[i]]
+        this_node = repo_data[prs_out[i]]
         if len(this_node["nodes"]) == 1:
             this_node = this_node["nodes"][0]
-            pr_labels = set()
-            pr_label_ids = set()
-            reviewers = set()
-            reviewer_ids = set()
-            assignees = set()
-            assignee_ids = set()
-            for label in this_node["labels"]["nodes"]:
-                pr_labels.add(label["name"])
-                pr_label_ids.add(label["id"])
-            for revs in this_node["reviewRequests"]["nodes"]:
-                if not revs["requestedReviewer"]:
-                    continue
-                elif "login" in revs["requestedReviewer"]:
-                    reviewers.add(revs["requestedReviewer"]["login"])
-                    reviewer_ids.add(revs["requestedReviewer"]["id"])
-            for revs in this_node["latestReviews"]["nodes"]:
-                # Ignore self reviews and bot reviews (without a login)
-                if not revs["viewerDidAuthor"] and "login" in revs["author"]:
-                    reviewers.add(revs["author"]["login"])
-                    reviewer_ids.add(revs["author"]["id"])
-            for user in this_node["assignees"]["nodes"]:
-                assignees.add(user["login"])
-                assignee_ids.add(user["id"])
+            label_nodes = this_node["labels"]["nodes"]
+            assignee_nodes = this_node["assignees"]["nodes"]
+            reviewer_nodes = [
+                revs["requestedReviewer"]
+                for revs in this_node["reviewRequests"]["nodes"]
+                if revs["requestedReviewer"] and "login" in revs["requestedReviewer"]
+            ]
+            # Ignore self reviews and bot reviews (without a login)
+            reviewer_nodes.extend(
+                revs["author"]
+                for revs in this_node["latestReviews"]["nodes"]
+                if not revs["viewerDidAuthor"] and "login" in revs["author"]
+            )
 
             # The plain headRef and baseRef fields return the latest commit id associated with
             # that branch name which may be newer than the PR itself if it was merged. We want
@@ -300,10 +393,6 @@ async def query_everything(
                 else None
             )
 
-            comments = []
-            for c in this_node["comments"]["nodes"]:
-                comments.append(PrComment(c["body"], c["id"]))
-
             prs.append(
                 PrInfo(
                     id=this_node["id"],
@@ -314,15 +403,14 @@ async def query_everything(
                     headRefOid=headRefOid,
                     body=this_node["body"],
                     title=this_node["title"],
-                    reviewers=reviewers,
-                    reviewer_ids=reviewer_ids,
-                    assignees=assignees,
-                    assignee_ids=assignee_ids,
-                    labels=pr_labels,
-                    label_ids=pr_label_ids,
+                    reviewers={user["login"]: user["id"] for user in reviewer_nodes},
+                    assignees={user["login"]: user["id"] for user in assignee_nodes},
+                    labels={label["name"]: label["id"] for label in label_nodes},
                     is_draft=this_node["isDraft"],
                     state=this_node["state"],
-                    comments=comments,
+                    comments=[
+                        PrComment(c["body"], c["id"]) for c in this_node["comments"]["nodes"]
+                    ],
                 )
             )
         else:
@@ -331,7 +419,7 @@ async def query_everything(
     names_to_ids = {}
     names_to_logins = {}
     for i, user_id in enumerate(user_ids):
-        this_node = pr_result["data"]["repository"][user_id_out[i]]
+        this_node = repo_data[user_id_out[i]]
         if len(this_node["nodes"]) == 0:
             logging.warning("No matching user found for {}".format(user_id))
         else:
@@ -357,14 +445,14 @@ async def query_everything(
 
     labels_to_ids = {}
     for i, label in enumerate(labels):
-        this_node = pr_result["data"]["repository"][label_out[i]]
+        this_node = repo_data[label_out[i]]
         if this_node is not None:
             labels_to_ids[label] = this_node["id"]
         else:
             logging.warning("Couldn't find an existing label named {}".format(label))
 
     return (
-        pr_result["data"]["repository"]["id"],
+        repo_data["id"],
         prs,
         names_to_ids,
         names_to_logins,
@@ -382,6 +470,24 @@ async def create_pull_requests(
     """
     Create all pull requests given in prs and modify them to add the new pr node id and URL.
     """
+    # Batches are sent one at a time, so PR numbers follow stack order and github doesn't see
+    # concurrent content creation, which its secondary rate limits penalize.
+    for i in range(0, len(prs), GRAPHQL_BATCH_SIZE):
+        await create_pull_requests_batch(
+            github_ep, repo_id, repo_info, fork_info, prs[i : i + GRAPHQL_BATCH_SIZE]
+        )
+
+
+async def create_pull_requests_batch(
+    github_ep: github.GitHubEndpoint,
+    repo_id: str,
+    repo_info: GitHubRepoInfo,
+    fork_info: GitHubRepoInfo,
+    prs: List[PrInfo],
+) -> None:
+    """
+    Create a single batch of pull requests in one request.
+    """
     inputs = []
     for pr in prs:
         headRef = (
@@ -402,18 +508,15 @@ async def create_pull_requests(
     arg_str = ", ".join(get_args_declaration(inputs_args, "CreatePullRequestInput!"))
 
     request_str = "".join(
-        len(inputs)
-        * [
-            """
-            {}: createPullRequest(input: ${}) {{
-                pullRequest {{
-                    id
-                    url
-                }}
-            }},"""
-        ]
+        f"""
+        {out}: createPullRequest(input: ${arg}) {{
+            pullRequest {{
+                id
+                url
+            }}
+        }},"""
+        for out, arg in zip(prs_out, inputs_args)
     )
-    request_str = request_str.format(*zip_and_flatten(prs_out, inputs_args.keys()))
 
     mutation_str = f"""
         mutation ({arg_str}) {{
@@ -429,10 +532,144 @@ async def create_pull_requests(
             pr.url = result["url"]
 
 
+@functools.lru_cache(maxsize=64)
+def _build_update_mutation(
+    n_inputs: int,
+    n_labels: int,
+    n_reviewers: int,
+    n_assignees: int,
+    n_to_draft: int,
+    n_from_draft: int,
+    n_comments: int,
+    n_edit_comments: int,
+) -> str:
+    """
+    Return the mutation string used by update_pull_requests. The mutation only depends on the
+    number of each type of update, so it is cached.
+    """
+    inputs_args = get_result_args(n_inputs, "pr")
+    prs_out = get_result_args(n_inputs, "pr_out")
+
+    labels_args = get_result_args(n_labels, "label")
+    labels_out = get_result_args(n_labels, "label_out")
+
+    reviewers_args = get_result_args(n_reviewers, "rev")
+    reviewers_out = get_result_args(n_reviewers, "rev_out")
+
+    assignees_args = get_result_args(n_assignees, "asn")
+    assignees_out = get_result_args(n_assignees, "asn_out")
+
+    to_draft_args = get_result_args(n_to_draft, "to_d")
+    to_draft_out = get_result_args(n_to_draft, "to_d_out")
+
+    from_draft_args = get_result_args(n_from_draft, "from_d")
+    from_draft_out = get_result_args(n_from_draft, "from_d_out")
+
+    comments_args = get_result_args(n_comments, "com")
+    comments_out = get_result_args(n_comments, "com_out")
+
+    edit_comments_args = get_result_args(n_edit_comments, "edit_com")
+    edit_comments_out = get_result_args(n_edit_comments, "edit_com_out")
+
+    arg_str = ", ".join(
+        get_args_declaration(inputs_args, "UpdatePullRequestInput!")
+        + get_args_declaration(labels_args, "AddLabelsToLabelableInput!")
+        + get_args_declaration(reviewers_args, "RequestReviewsInput!")
+        + get_args_declaration(assignees_args, "AddAssigneesToAssignableInput!")
+        + get_args_declaration(to_draft_args, "ConvertPullRequestToDraftInput!")
+        + get_args_declaration(from_draft_args, "MarkPullRequestReadyForReviewInput!")
+        + get_args_declaration(comments_args, "AddCommentInput!")
+        + get_args_declaration(edit_comments_args, "UpdateIssueCommentInput!")
+    )
+
+    update_str = "".join(
+        f"""
+        {out}: updatePullRequest(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(prs_out, inputs_args)
+    )
+
+    request_reviewers_str = "".join(
+        f"""
+        {out}: requestReviews(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(reviewers_out, reviewers_args)
+    )
+    assignees_str = "".join(
+        f"""
+        {out}: addAssigneesToAssignable(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(assignees_out, assignees_args)
+    )
+
+    add_labels_str = "".join(
+        f"""
+        {out}: addLabelsToLabelable(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(labels_out, labels_args)
+    )
+
+    to_draft_str = "".join(
+        f"""
+        {out}: convertPullRequestToDraft(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(to_draft_out, to_draft_args)
+    )
+
+    from_draft_str = "".join(
+        f"""
+        {out}: markPullRequestReadyForReview(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(from_draft_out, from_draft_args)
+    )
+
+    add_comments_str = "".join(
+        f"""
+        {out}: addComment(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(comments_out, comments_args)
+    )
+
+    edit_comments_str = "".join(
+        f"""
+        {out}: updateIssueComment(input: ${arg}) {{
+            clientMutationId
+        }},"""
+        for out, arg in zip(edit_comments_out, edit_comments_args)
+    )
+
+    # Have any add comment mutations first in order to ensure that comments are at the top of the PR
+    mutation_str = f"""
+        mutation ({arg_str}) {{
+            {add_comments_str}{update_str}{request_reviewers_str}{assignees_str}{add_labels_str}\
+{to_draft_str}{from_draft_str}{edit_comments_str}
+        }}"""
+
+    return mutation_str
+
+
 async def update_pull_requests(github_ep: github.GitHubEndpoint, prs: List[PrUpdate]) -> None:
     """
     Update the given pull request contents, and also add reviewers and labels.
     """
+    # Batches include comment creation, so like create_pull_requests they are sent one at a time
+    # to stay clear of github's secondary rate limits on concurrent content creation.
+    for i in range(0, len(prs), GRAPHQL_BATCH_SIZE):
+        await update_pull_requests_batch(github_ep, prs[i : i + GRAPHQL_BATCH_SIZE])
+
+
+async def update_pull_requests_batch(github_ep: github.GitHubEndpoint, prs: List[PrUpdate]) -> None:
+    """
+    Update a single batch of pull requests in one request. All mutations for a given pull request
+    are kept in the same batch so their relative order is preserved.
+    """
     inputs = []
     labels = []
     reviewers = []
@@ -501,150 +738,36 @@ async def update_pull_requests(github_ep: github.GitHubEndpoint, prs: List[PrUpd
                     "subjectId": pr.id,
                 })
 
-    inputs_args = get_args_dict(inputs, "pr")
-    prs_out = get_result_args(len(inputs), "pr_out")
-
-    labels_args = get_args_dict(labels, "label")
-    labels_out = get_result_args(len(labels), "label_out")
-
-    reviewers_args = get_args_dict(reviewers, "rev")
-    reviewers_out = get_result_args(len(reviewers), "rev_out")
-
-    assignees_args = get_args_dict(assignees, "asn")
-    assignees_out = get_result_args(len(assignees), "asn_out")
-
-    to_draft_args = get_args_dict(convert_to_draft, "to_d")
-    to_draft_out = get_result_args(len(convert_to_draft), "to_d_out")
-
-    from_draft_args = get_args_dict(convert_from_draft, "from_d")
-    from_draft_out = get_result_args(len(convert_from_draft), "from_d_out")
-
-    comments_args = get_args_dict(comments, "com")
-    comments_out = get_result_args(len(comments), "com_out")
-
-    edit_comments_args = get_args_dict(edit_comments, "edit_com")
-    edit_comments_out = get_result_args(len(edit_comments), "edit_com_out")
-
-    arg_str = ", ".join(
-        get_args_declaration(inputs_args, "UpdatePullRequestInput!")
-        + get_args_declaration(labels_args, "AddLabelsToLabelableInput!")
-        + get_args_declaration(reviewers_args, "RequestReviewsInput!")
-        + get_args_declaration(assignees_args, "AddAssigneesToAssignableInput!")
-        + get_args_declaration(to_draft_args, "ConvertPullRequestToDraftInput!")
-        + get_args_declaration(from_draft_args, "MarkPullRequestReadyForReviewInput!")
-        + get_args_declaration(comments_args, "AddCommentInput!")
-        + get_args_declaration(edit_comments_args, "UpdateIssueCommentInput!")
+    # Merge all variables into one dict directly rather than building a dict per kind of mutation
+    all_vars: Dict[str, Any] = {}
+    for prefix, args in (
+        ("com", comments),
+        ("pr", inputs),
+        ("rev", reviewers),
+        ("asn", assignees),
+        ("label", labels),
+        ("to_d", convert_to_draft),
+        ("from_d", convert_from_draft),
+        ("edit_com", edit_comments),
+    ):
+        for n, arg in enumerate(args):
+            all_vars[f"{prefix}{n}"] = arg
+
+    mutation_str = _build_update_mutation(
+        len(inputs),
+        len(labels),
+        len(reviewers),
+        len(assignees),
+        len(convert_to_draft),
+        len(convert_from_draft),
+        len(comments),
+        len(edit_comments),
     )
 
-    update_str = "".join(
-        len(inputs)
-        * [
-            """
-            {}: updatePullRequest(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    update_str = update_str.format(*zip_and_flatten(prs_out, inputs_args.keys()))
-
-    request_reviewers_str = "".join(
-        len(reviewers_args)
-        * [
-            """
-            {}: requestReviews(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    request_reviewers_str = request_reviewers_str.format(
-        *zip_and_flatten(reviewers_out, reviewers_args.keys())
-    )
-    assignees_str = "".join(
-        len(assignees_args)
-        * [
-            """
-            {}: addAssigneesToAssignable(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    assignees_str = assignees_str.format(*zip_and_flatten(assignees_out, assignees_args.keys()))
-
-    add_labels_str = "".join(
-        len(labels_args)
-        * [
-            """
-            {}: addLabelsToLabelable(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    add_labels_str = add_labels_str.format(*zip_and_flatten(labels_out, labels_args.keys()))
-
-    to_draft_str = "".join(
-        len(convert_to_draft)
-        * [
-            """
-            {}: convertPullRequestToDraft(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    to_draft_str = to_draft_str.format(*zip_and_flatten(to_draft_out, to_draft_args.keys()))
-
-    from_draft_str = "".join(
-        len(convert_from_draft)
-        * [
-            """
-            {}: markPullRequestReadyForReview(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    from_draft_str = from_draft_str.format(*zip_and_flatten(from_draft_out, from_draft_args.keys()))
-
-    add_comments_str = "".join(
-        len(comments_args)
-        * [
-            """
-            {}: addComment(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    add_comments_str = add_comments_str.format(*zip_and_flatten(comments_out, comments_args.keys()))
-
-    edit_comments_str = "".join(
-        len(edit_comments_args)
-        * [
-            """
-            {}: updateIssueComment(input: ${}) {{
-                clientMutationId
-            }},"""
-        ]
-    )
-    edit_comments_str = edit_comments_str.format(
-        *zip_and_flatten(edit_comments_out, edit_comments_args.keys())
-    )
-
-    # Have any add comment mutations first in order to ensure that comments are at the top of the PR
-    mutation_str = f"""
-        mutation ({arg_str}) {{
-            {add_comments_str}{update_str}{request_reviewers_str}{assignees_str}{add_labels_str}\
-{to_draft_str}{from_draft_str}{edit_comments_str}
-        }}"""
-
     try:
         await github_ep.graphql(
             mutation_str,
-            **comments_args,
-            **inputs_args,
-            **reviewers_args,
-            **assignees_args,
-            **labels_args,
-            **to_draft_args,
-            **from_draft_args,
-            **edit_comments_args,
+            **all_vars,
         )
     except RevupGithubException as e:
         if "timeout" in e.message:
@@ -657,7 +780,8 @@ async def update_pull_requests(github_ep: github.GitHubEndpoint, prs: List[PrUpd
 
 
 RE_PR_URL = re.compile(
-    r"^https://(?P<github_url>[^/]+)/(?P<owner>[^/]+)/(?P<name>[^/]+)/pull/(?P<number>[0-9]+)/?$"
+    r"https://(?P<github_url>[^/]+)/(?P<owner>[^/]+)/(?P<name>[^/]+)/pull/(?P<number>[0-9]+)/?",
+    re.ASCII,
 )
 
 
@@ -672,13 +796,13 @@ GitHubPullRequestParams = NamedTuple(
 )
 
 
+@functools.lru_cache(maxsize=1024)
 def parse_pull_request_url(pull_request: str) -> GitHubPullRequestParams:
-    m = RE_PR_URL.match(pull_request)
+    m = RE_PR_URL.fullmatch(pull_request)
     if not m:
         raise RuntimeError("Did not understand PR argument.  PR must be URL")
 
-    github_url = m.group("github_url")
-    owner = m.group("owner")
-    name = m.group("name")
-    number = int(m.group("number"))
-    return GitHubPullRequestParams(github_url=github_url, owner=owner, name=name, number=number)
+    github_url, owner, name, number = m.groups()
+    return GitHubPullRequestParams(
+        github_url=github_url, owner=owner, name=name, number=int(number)
+    )
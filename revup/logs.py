@@ -1,28 +1,45 @@
 import logging
 import re
-from typing import Dict
+from typing import Dict, Optional, Pattern
 
 from rich._log_render import LogRender
 from rich.logging import RichHandler
 from rich.text import Text
 
+RE_URL_CREDENTIALS = re.compile(r":\/\/(.*?)\@")
+
 
 class RedactingFilter(logging.Filter):
     redactions: Dict[str, str]
 
+    # Single pattern matching any needle in redactions. Rebuilt lazily after redact() is called.
+    redactions_re: Optional[Pattern[str]]
+
     def __init__(self) -> None:
         super().__init__()
         self.redactions = {}
+        self.redactions_re = None
 
     # Remove sensitive information from URLs
     def _filter(self, s: str) -> str:
-        s = re.sub(r":\/\/(.*?)\@", r"://<USERNAME>:<PASSWORD>@", s)
-        for needle, replace in self.redactions.items():
-            s = s.replace(needle, replace)
-        return s
+        s = RE_URL_CREDENTIALS.sub(r"://<USERNAME>:<PASSWORD>@", s)
+        if not self.redactions:
+            return s
+        if self.redactions_re is None:
+            # Prefer the longest needle when several match at the same position
+            self.redactions_re = re.compile(
+                "|".join(map(re.escape, sorted(self.redactions, key=len, reverse=True)))
+            )
+        return self.redactions_re.sub(lambda m: self.redactions[m.group(0)], s)
 
     def filter(self, record: logging.LogRecord) -> bool:
-        record.msg = self._filter(record.msg)
+        # Messages can be arbitrary objects, logging will str() them when formatting anyway.
+        msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+        if not self.redactions and "://" not in msg:
+            # Fast path for the common case where there's nothing that could be redacted
+            record.msg = msg
+            return True
+        record.msg = self._filter(msg)
         return True
 
     # Redact specific strings; e.g., authorization tokens.  This won't
@@ -34,11 +51,15 @@ class RedactingFilter(logging.Filter):
         if needle == "":
             return
         self.redactions[needle] = replace
+        self.redactions_re = None
 
 
 class RevupRichHandler(RichHandler):
     def get_level_text(self, record: logging.LogRecord) -> Text:
-        self._log_render.show_level = True
+        # Only warnings and errors show a level, so only touch the renderer when that changes
+        show_level = record.levelname in ("WARNING", "ERROR")
+        if self._log_render.show_level != show_level:
+            self._log_render.show_level = show_level
 
         if record.levelname == "WARNING":
             return Text.styled("W:", style="bold yellow")
@@ -46,7 +67,6 @@ class RevupRichHandler(RichHandler):
         if record.levelname == "ERROR":
             return Text.styled("E:", style="bold red")
 
-        self._log_render.show_level = False
         return Text()
 
     def set_render(self, log_render: LogRender) -> None:
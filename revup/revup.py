@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import logging
 import os
 import stat
@@ -8,7 +9,7 @@ import subprocess
 import sys
 from builtins import FileNotFoundError
 from contextlib import asynccontextmanager
-from typing import Any, AsyncGenerator, List, Tuple
+from typing import Any, AsyncGenerator, List, Optional, Tuple
 
 import revup
 from revup import config, git, logs, shell
@@ -18,6 +19,9 @@ from revup.types import RevupUsageException
 REVUP_CONFIG_ENV_VAR = "REVUP_CONFIG_PATH"
 CONFIG_FILE_NAME = ".revupconfig"
 
+# Config file ownership can only be checked on platforms with uids
+HAS_GETUID = hasattr(os, "getuid")
+
 
 class HelpAction(argparse.Action):
     """
@@ -26,7 +30,16 @@ class HelpAction(argparse.Action):
 
     def __call__(self, parser: Any, namespace: Any, values: Any, option_string: Any = None) -> None:
         source_dir = os.path.dirname(os.path.abspath(__file__))
-        man_cmd = ("man", "-M", source_dir, parser.prog.split()[-1])
+        page = parser.prog.split()[-1]
+        if not any(
+            os.path.isfile(os.path.join(source_dir, "man1", f"{page}.1{ext}"))
+            for ext in ("", ".gz")
+        ):
+            # Don't bother running man if the page isn't there, such as when running from source
+            print(parser.format_help())
+            sys.exit(0)
+
+        man_cmd = ("man", "-M", source_dir, page)
         try:
             if subprocess.call(man_cmd) != 0:
                 print("Error in showing man page")
@@ -60,34 +73,40 @@ def make_toplevel_parser() -> RevupArgParser:
 
 
 def get_config_path() -> str:
-    home_path = os.path.expanduser("~")
-    return os.environ.get(
-        os.path.expanduser(REVUP_CONFIG_ENV_VAR), os.path.join(home_path, CONFIG_FILE_NAME)
-    )
+    config_path = os.environ.get(REVUP_CONFIG_ENV_VAR)
+    if config_path is not None:
+        return config_path
+    return os.path.join(os.path.expanduser("~"), CONFIG_FILE_NAME)
 
 
-async def get_config() -> config.Config:
+async def get_config(repo_root: str) -> config.Config:
     config_path = get_config_path()
-    if os.path.isfile(config_path) and hasattr(os, "getuid"):
-        config_stat = os.stat(config_path)
-        if config_stat.st_uid != os.getuid():
-            raise RevupUsageException("Config file is not owned by the current user!")
-        if stat.S_IMODE(config_stat.st_mode) != 0o600:
-            raise RevupUsageException(
-                f"Permissions too loose on config file!\nTry `chmod 0600 {config_path}`"
-            )
-
-    # There's a chicken/egg problem in getting git path from config when we need git
-    # to find the path of the config file. Just this once, we use the default.
-    sh = shell.Shell()
-    repo_root = (await sh.sh(git.get_default_git(), "rev-parse", "--show-toplevel"))[1].rstrip()
     conf = config.Config(config_path, os.path.join(repo_root, CONFIG_FILE_NAME))
+    # Open the config file once, so the ownership and mode checks apply to the file that is read
+    try:
+        with open(config_path) as config_file:
+            if HAS_GETUID:
+                config_stat = os.fstat(config_file.fileno())
+                if stat.S_ISREG(config_stat.st_mode):
+                    if config_stat.st_uid != os.getuid():
+                        raise RevupUsageException("Config file is not owned by the current user!")
+                    if stat.S_IMODE(config_stat.st_mode) != 0o600:
+                        raise RevupUsageException(
+                            "Permissions too loose on config file!\nTry `chmod 0600"
+                            f" {config_path}`"
+                        )
+            conf.read(config_file)
+            return conf
+    except OSError:
+        # The user config can't be read, so only the repo config applies
+        pass
     conf.read()
     return conf
 
 
-async def get_git(args: argparse.Namespace) -> git.Git:
-    sh = shell.Shell(not args.verbose)
+async def get_git(args: argparse.Namespace, sh: shell.Shell, repo_dirs: Tuple[str, str]) -> git.Git:
+    # The shell used at startup is reused, now that we know whether commands should be logged
+    sh.quiet = not args.verbose
     git_ctx = await git.make_git(
         sh,
         args.git_path,
@@ -97,6 +116,7 @@ async def get_git(args: argparse.Namespace) -> git.Git:
         args.base_branch_globs,
         args.keep_temp,
         args.editor,
+        repo_dirs,
     )
 
     return git_ctx
@@ -115,9 +135,16 @@ async def github_connection(
 ) -> AsyncGenerator[Tuple, None]:
     from revup import github_real
 
-    repo_info = await git_ctx.get_github_repo_info(
-        github_url=args.github_url, remote_name=args.remote_name
-    )
+    # Look up the fork remote at the same time, if it's different
+    remote_names = [args.remote_name]
+    if args.fork_name and args.fork_name != args.remote_name:
+        remote_names.append(args.fork_name)
+    remote_infos = await asyncio.gather(*(
+        git_ctx.get_github_repo_info(github_url=args.github_url, remote_name=remote_name)
+        for remote_name in remote_names
+    ))
+    repo_info = remote_infos[0]
+    fork_info = remote_infos[-1]
 
     if not repo_info.owner or not repo_info.name:
         raise RevupUsageException(
@@ -128,12 +155,6 @@ async def github_connection(
             f"or change the configured remote in {conf.config_path}/"
         )
 
-    fork_info = repo_info
-    if args.fork_name and args.fork_name != args.remote_name:
-        fork_info = await git_ctx.get_github_repo_info(
-            github_url=args.github_url, remote_name=args.fork_name
-        )
-
     if not fork_info.owner or not fork_info.name:
         raise RevupUsageException(
             f'Configured remote fork "{args.fork_info}" does not '
@@ -175,9 +196,81 @@ async def github_connection(
         yield github_ep, repo_info, fork_info
     finally:
         await github_ep.close()
+        await github_real.close_shared_connector()
+
+
+def add_toolkit_arguments(toolkit_parser: RevupArgParser) -> None:
+    """
+    Add the toolkit subcommands and their arguments. This is only needed when running toolkit.
+    """
+    toolkit_subparsers = toolkit_parser.add_subparsers(dest="toolkit_cmd", required=True)
+    detect_branch = toolkit_subparsers.add_parser(
+        "detect-branch", description="Detect the base branch of the current branch."
+    )
+    detect_branch.add_argument(
+        "--show-all", "-s", action="store_true", help="Show all candidates, not just the best one"
+    )
+    detect_branch.add_argument(
+        "--no-limit", "-n", action="store_true", help="Don't limit to release branches"
+    )
+    toolkit_cherry_pick = toolkit_subparsers.add_parser(
+        "cherry-pick", description="Cherry pick given commit to a new parent"
+    )
+    toolkit_cherry_pick.add_argument("--commit", "-c", help="Commit to cherry-pick", required=True)
+    toolkit_cherry_pick.add_argument("--parent", "-p", help="Parent commit", required=True)
+    toolkit_diff_target = toolkit_subparsers.add_parser(
+        "diff-target", description="Make a virtual diff target from the given commits"
+    )
+    toolkit_diff_target.add_argument("--old-head", "-oh", help="Old head commit", required=True)
+    toolkit_diff_target.add_argument(
+        "--old-base", "-ob", help="Old base commit (parent of old head by default)"
+    )
+    toolkit_diff_target.add_argument("--new-head", "-nh", help="New head commit", required=True)
+    toolkit_diff_target.add_argument(
+        "--new-base", "-nb", help="New base commit (parent of old head by default)"
+    )
+    toolkit_diff_target.add_argument("--parent", "-p", help="Parent commit")
+    toolkit_fork_point = toolkit_subparsers.add_parser(
+        "fork-point", description="Find the first divergence between two branches"
+    )
+    toolkit_fork_point.add_argument("branches", nargs=2, help="Branches to compare")
+    toolkit_closest_branch = toolkit_subparsers.add_parser(
+        "closest-branch", description="Find the nearest base branch to the given commit."
+    )
+    toolkit_closest_branch.add_argument("branch", nargs=1, help="Commit/branch")
+    toolkit_closest_branch.add_argument(
+        "--allow-self", action="store_true", help='Allow the branch itself to be a valid "closest"'
+    )
+    toolkit_list_topics = toolkit_subparsers.add_parser(
+        "list-topics", description="List all topics and their commits"
+    )
+    toolkit_list_topics.add_argument(
+        "--base-branch", "-b", help="Use the given branch as the base instead of autodetecting."
+    )
+    toolkit_list_topics.add_argument(
+        "--relative-branch", "-e", help="Use the given relative branch."
+    )
+    list_topics_commit_options = toolkit_list_topics.add_mutually_exclusive_group()
+    list_topics_commit_options.add_argument(
+        "--commit-ids",
+        "-c",
+        action="store_true",
+        help="Print the IDs for all commits within a topic",
+    )
+    list_topics_commit_options.add_argument(
+        "--titles",
+        "-t",
+        action="store_true",
+        help="Print the titles for all commits within a topic",
+    )
 
 
 async def main() -> int:
+    if sys.argv[1:2] == ["--version"]:
+        # Nothing else needs to be set up to print the version
+        print(f"revup {revup.__version__}")
+        return 0
+
     # Description / help text isn't given to the parser since the actual
     # help text is in the markdown files.
     revup_parser = make_toplevel_parser()
@@ -265,81 +358,38 @@ async def main() -> int:
     config_parser.add_argument("--repo", "-r", action="store_true")
     config_parser.add_argument("--delete", "-d", action="store_true")
 
-    toolkit_subparsers = toolkit_parser.add_subparsers(dest="toolkit_cmd", required=True)
-    detect_branch = toolkit_subparsers.add_parser(
-        "detect-branch", description="Detect the base branch of the current branch."
-    )
-    detect_branch.add_argument(
-        "--show-all", "-s", action="store_true", help="Show all candidates, not just the best one"
-    )
-    detect_branch.add_argument(
-        "--no-limit", "-n", action="store_true", help="Don't limit to release branches"
-    )
-    toolkit_cherry_pick = toolkit_subparsers.add_parser(
-        "cherry-pick", description="Cherry pick given commit to a new parent"
-    )
-    toolkit_cherry_pick.add_argument("--commit", "-c", help="Commit to cherry-pick", required=True)
-    toolkit_cherry_pick.add_argument("--parent", "-p", help="Parent commit", required=True)
-    toolkit_diff_target = toolkit_subparsers.add_parser(
-        "diff-target", description="Make a virtual diff target from the given commits"
-    )
-    toolkit_diff_target.add_argument("--old-head", "-oh", help="Old head commit", required=True)
-    toolkit_diff_target.add_argument(
-        "--old-base", "-ob", help="Old base commit (parent of old head by default)"
-    )
-    toolkit_diff_target.add_argument("--new-head", "-nh", help="New head commit", required=True)
-    toolkit_diff_target.add_argument(
-        "--new-base", "-nb", help="New base commit (parent of old head by default)"
-    )
-    toolkit_diff_target.add_argument("--parent", "-p", help="Parent commit")
-    toolkit_fork_point = toolkit_subparsers.add_parser(
-        "fork-point", description="Find the first divergence between two branches"
-    )
-    toolkit_fork_point.add_argument("branches", nargs=2, help="Branches to compare")
-    toolkit_closest_branch = toolkit_subparsers.add_parser(
-        "closest-branch", description="Find the nearest base branch to the given commit."
-    )
-    toolkit_closest_branch.add_argument("branch", nargs=1, help="Commit/branch")
-    toolkit_closest_branch.add_argument(
-        "--allow-self", action="store_true", help='Allow the branch itself to be a valid "closest"'
-    )
-    toolkit_list_topics = toolkit_subparsers.add_parser(
-        "list-topics", description="List all topics and their commits"
-    )
-    toolkit_list_topics.add_argument(
-        "--base-branch", "-b", help="Use the given branch as the base instead of autodetecting."
-    )
-    toolkit_list_topics.add_argument(
-        "--relative-branch", "-e", help="Use the given relative branch."
-    )
-    list_topics_commit_options = toolkit_list_topics.add_mutually_exclusive_group()
-    list_topics_commit_options.add_argument(
-        "--commit-ids",
-        "-c",
-        action="store_true",
-        help="Print the IDs for all commits within a topic",
-    )
-    list_topics_commit_options.add_argument(
-        "--titles",
-        "-t",
-        action="store_true",
-        help="Print the titles for all commits within a topic",
-    )
+    toolkit_parser.set_lazy_add_arguments(add_toolkit_arguments)
 
-    # Do an initial parsing pass, which handles HelpAction
+    # Help and version exit while parsing, so handle them before requiring a repo to read config
+    if any(arg in ("-h", "--help", "--version") for arg in sys.argv[1:]):
+        revup_parser.parse_args()
+
+    # There's a chicken/egg problem in getting git path from config when we need git
+    # to find the path of the config file. Just this once, we use the default.
+    sh = shell.Shell()
+    repo_dirs = await git.get_repo_dirs(sh, git.get_default_git())
+    conf = await get_config(repo_dirs[0])
+
+    # Config values become parser defaults, so args only need to be parsed once. Errors from a
+    # broken config are deferred until we know the command, to avoid the situation where a broken
+    # config prevents you from running config at all. Subcommands only have their config applied
+    # if they actually run, which is never the case when running config.
+    config_error: Optional[ValueError] = None
+    try:
+        revup_parser.set_defaults_from_config(conf.get_config())
+    except ValueError as e:
+        config_error = e
+    for p in all_parsers:
+        if p is not revup_parser:
+            p.lazy_config = conf.get_config()
     args = revup_parser.parse_args()
-    conf = await get_config()
 
-    # Run config before setting the config, in order to avoid the situation where a broken
-    # config prevents you from running config at all.
     if args.cmd == "config":
         logs.configure_logger(False, {})
         return config.config_main(conf, args, all_parsers)
 
-    for p in all_parsers:
-        assert isinstance(p, RevupArgParser)
-        p.set_defaults_from_config(conf.get_config())
-    args = revup_parser.parse_args()
+    if config_error is not None:
+        raise config_error
 
     # So users don't accidentally leak their oauth when sharing logs
     logs.configure_logger(
@@ -348,53 +398,55 @@ async def main() -> int:
     )
     dump_args(args)
 
-    git_ctx = await get_git(args)
-
-    if args.cmd == "toolkit":
-        from revup import toolkit
+    git_ctx = await get_git(args, sh, repo_dirs)
+    try:
+        if args.cmd == "toolkit":
+            from revup import toolkit
 
-        return await toolkit.main(args=args, git_ctx=git_ctx)
+            return await toolkit.main(args=args, git_ctx=git_ctx)
 
-    elif args.cmd == "cherry-pick":
-        from revup import cherry_pick
+        elif args.cmd == "cherry-pick":
+            from revup import cherry_pick
 
-        return await cherry_pick.main(args=args, git_ctx=git_ctx)
+            return await cherry_pick.main(args=args, git_ctx=git_ctx)
 
-    elif args.cmd in ["commit", "amend"]:
-        from revup import amend
+        elif args.cmd in ["commit", "amend"]:
+            from revup import amend
 
-        # "commit" is an alias of "amend --insert"
-        args.insert = args.cmd == "commit" or args.insert
+            # "commit" is an alias of "amend --insert"
+            args.insert = args.cmd == "commit" or args.insert
 
-        repo_info = await git_ctx.get_github_repo_info(
-            github_url=args.github_url, remote_name=args.remote_name
-        )
+            repo_info = await git_ctx.get_github_repo_info(
+                github_url=args.github_url, remote_name=args.remote_name
+            )
 
-        if not repo_info.owner or not repo_info.name:
-            # Don't try to get topics for repos that are not in use with github
-            args.parse_topics = False
+            if not repo_info.owner or not repo_info.name:
+                # Don't try to get topics for repos that are not in use with github
+                args.parse_topics = False
 
-        return await amend.main(args=args, git_ctx=git_ctx)
+            return await amend.main(args=args, git_ctx=git_ctx)
 
-    elif args.cmd == "restack":
-        from revup import restack
+        elif args.cmd == "restack":
+            from revup import restack
 
-        return await restack.main(args=args, git_ctx=git_ctx)
+            return await restack.main(args=args, git_ctx=git_ctx)
 
-    async with github_connection(args=args, git_ctx=git_ctx, conf=conf) as (
-        github_ep,
-        repo_info,
-        fork_info,
-    ):
-        if args.cmd == "upload":
-            from revup import upload
+        async with github_connection(args=args, git_ctx=git_ctx, conf=conf) as (
+            github_ep,
+            repo_info,
+            fork_info,
+        ):
+            if args.cmd == "upload":
+                from revup import upload
 
-            return await upload.main(
-                args=args,
-                git_ctx=git_ctx,
-                github_ep=github_ep,
-                repo_info=repo_info,
-                fork_info=fork_info,
-            )
+                return await upload.main(
+                    args=args,
+                    git_ctx=git_ctx,
+                    github_ep=github_ep,
+                    repo_info=repo_info,
+                    fork_info=fork_info,
+                )
 
-    return 1
+        return 1
+    finally:
+        await git_ctx.close()
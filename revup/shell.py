@@ -8,6 +8,7 @@ import time
 from typing import (
     IO,
     Any,
+    BinaryIO,
     Callable,
     Coroutine,
     Dict,
@@ -15,12 +16,17 @@ from typing import (
     Optional,
     Sequence,
     Tuple,
-    TypeVar,
     Union,
 )
 
 _HANDLE = Union[None, int, IO[Any]]
 
+# Number of bytes to read at a time when capturing output.
+PIPE_READ_SIZE = 1 << 16
+
+# Size of the pipe buffer between the two commands of piped_sh(), where supported.
+PIPED_SH_BUFFER_SIZE = 1 << 20
+
 
 def log_command(args: Sequence[str]) -> None:
     """
@@ -30,19 +36,8 @@ def log_command(args: Sequence[str]) -> None:
         *args: the list of command line arguments you want to run
         env: the dictionary of environment variable settings for the command
     """
-    logging.debug("$ {}".format(" ".join(shlex.quote(arg) for arg in args)))
-
-
-K = TypeVar("K")
-
-
-V = TypeVar("V")
-
-
-def merge_dicts(x: Dict[K, V], y: Dict[K, V]) -> Dict[K, V]:
-    z = x.copy()
-    z.update(y)
-    return z
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("$ {}".format(" ".join(shlex.quote(arg) for arg in args)))
 
 
 async def process_stream(
@@ -65,6 +60,33 @@ async def process_stream(
     output = []
     if proc_stream is None:
         return b""
+    is_fd = isinstance(setting, int) and setting not in (-1, subprocess.PIPE, subprocess.STDOUT)
+    if transform is None and (setting == subprocess.PIPE or is_fd):
+        # Captured output and output to another fd don't need to be split into lines, so copy it
+        # in large chunks
+        while True:
+            chunk = await proc_stream.read(PIPE_READ_SIZE)
+            if not chunk:
+                break
+            if is_fd:
+                assert isinstance(setting, int)
+                os.write(setting, chunk)
+            else:
+                output.append(chunk)
+        if is_fd:
+            assert isinstance(setting, int)
+            os.close(setting)
+        return b"".join(output)
+    default_buffer: Optional[BinaryIO] = None
+    flush_lines = False
+    if setting is None:
+        default_buffer = getattr(default_stream, "buffer", None)
+        if default_buffer is not None:
+            # Anything already written through the text layer must come out first
+            default_stream.flush()
+            # Interactive output should show up as it's produced, otherwise flushing once at the
+            # end saves a write per line
+            flush_lines = default_stream.isatty()
     while True:
         try:
             line = await proc_stream.readuntil()
@@ -77,6 +99,8 @@ async def process_stream(
         if not line:
             if isinstance(setting, int) and setting not in (-1, subprocess.PIPE, subprocess.STDOUT):
                 os.close(setting)
+            if default_buffer is not None:
+                default_buffer.flush()
             break
         if setting == subprocess.PIPE:
             output.append(line)
@@ -85,8 +109,14 @@ async def process_stream(
         elif isinstance(setting, int) and setting != -1:
             os.write(setting, line)
         elif setting is None:
-            # See https://stackoverflow.com/questions/55681488
-            default_stream.write(line.decode("utf-8"))
+            # Write bytes straight to the underlying binary stream when there is one, which
+            # avoids decoding every line. See https://stackoverflow.com/questions/55681488
+            if default_buffer is not None:
+                default_buffer.write(line)
+                if flush_lines:
+                    default_buffer.flush()
+            else:
+                default_stream.write(line.decode("utf-8", "replace"))
         elif isinstance(setting, IO):
             # don't use setting.write directly, that will
             # not properly handle binary.  This gives us
@@ -102,9 +132,13 @@ async def feed_input(
         return
     if not input_str:
         return
-    stdin_writer.write(input_str.encode("utf-8"))
-    await stdin_writer.drain()
-    stdin_writer.close()
+    data = input_str.encode("utf-8")
+    stdin_writer.write(data)
+    if len(data) > PIPE_READ_SIZE:
+        # Only large inputs need to wait for the transport's buffer to be flushed
+        await stdin_writer.drain()
+    # Signals EOF once everything written has been flushed
+    stdin_writer.write_eof()
 
 
 class Shell:
@@ -117,6 +151,10 @@ class Shell:
     # Current working directory of shell.
     cwd: str
 
+    # Snapshot of the process environment, which extra environment variables are added to.
+    # Taken on first use since it doesn't change while running.
+    environ: Optional[Dict[str, str]] = None
+
     def __init__(
         self,
         quiet: bool = True,
@@ -154,15 +192,24 @@ class Shell:
         if input_str:
             stdin = subprocess.PIPE
 
-        if env is not None:
-            env = merge_dicts(dict(os.environ), env)
+        if env:
+            if self.environ is None:
+                self.environ = dict(os.environ)
+            env = {**self.environ, **env}
+        else:
+            # Let the child inherit our environment directly
+            env = None
 
         proc = asyncio.create_subprocess_exec(
             *args,
             stdin=stdin,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            cwd=self.cwd,
+            # subprocess can only use the cheaper posix_spawn() instead of fork and exec when cwd
+            # isn't given and fds aren't closed. Our fds are non-inheritable by default, so there
+            # is nothing for close_fds to do anyway.
+            cwd=None if self.cwd == os.getcwd() else self.cwd,
+            close_fds=False,
             env=env,
         )
 
@@ -221,7 +268,13 @@ class Shell:
             output_transform=output_transform,
         )
 
-        _, out, err, ret = await asyncio.gather(*tasks)
+        feed, out_coro, err_coro, wait_coro = tasks
+        if input_str:
+            _, out, err, ret = await asyncio.gather(feed, out_coro, err_coro, wait_coro)
+        else:
+            # There's nothing to feed to stdin, so don't bother scheduling it
+            feed.close()
+            out, err, ret = await asyncio.gather(out_coro, err_coro, wait_coro)
 
         ret = self.handle_sh_results(ret, out, err, stdout, raiseonerror, quiet, *args)
         if not self.quiet:
@@ -244,6 +297,15 @@ class Shell:
     ) -> Tuple[int, str]:
         start_time = time.time()
         read, write = os.pipe()
+        if sys.platform == "linux":
+            import fcntl
+
+            # Output of the first command is written to the pipe from the event loop, so a bigger
+            # buffer means it blocks less often while waiting for the second command to read.
+            try:
+                fcntl.fcntl(write, getattr(fcntl, "F_SETPIPE_SZ", 1031), PIPED_SH_BUFFER_SIZE)
+            except OSError:
+                pass
         log_args = args1 + ["|"] + args2
         if not self.quiet:
             log_command(log_args)
@@ -286,19 +348,24 @@ class Shell:
             logging.warning(err.decode(errors="backslashreplace"))
         elif not (quiet or self.quiet) and err:
             logging.debug("# stderr:\n{}".format(err.decode(errors="backslashreplace")))
+        # Output is only decoded once, unless it isn't valid utf-8
+        out_str: Optional[str] = None
         if not (quiet or self.quiet) and out:
+            try:
+                out_str = out.decode()
+                log_str = out_str
+            except UnicodeDecodeError:
+                log_str = out.decode(errors="backslashreplace")
             logging.debug(
-                "{}{}".format(
-                    ("# stdout:\n" if err else ""),
-                    out.decode(errors="backslashreplace").replace("\0", "\\0"),
-                )
+                "{}{}".format(("# stdout:\n" if err else ""), log_str.replace("\0", "\\0"))
             )
 
         if returncode != 0 and raiseonerror:
             raise RuntimeError("{} failed with exit code {}".format(" ".join(args), returncode))
 
         if stdout == subprocess.PIPE:
-            return (returncode, out.decode())  # do a strict decode for actual return
+            # do a strict decode for actual return
+            return (returncode, out_str if out_str is not None else out.decode())
         else:
             return (returncode, "")
 
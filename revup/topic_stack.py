@@ -2,13 +2,15 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import os
 import re
 import subprocess
 from collections import defaultdict
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Iterator, List, Optional, Set, Tuple
+from itertools import islice
+from typing import Collection, Dict, Iterator, List, Optional, Set, Tuple
 
 from rich import get_console
 from rich.markup import escape
@@ -60,7 +62,7 @@ TAG_RELATIVE_BRANCH = "relative-branch"
 TAG_UPLOADER = "uploader"
 TAG_UPDATE_PR_BODY = "update-pr-body"
 TAG_BRANCH_FORMAT = "branch-format"
-VALID_TAGS = {
+VALID_TAGS = frozenset({
     TAG_BRANCH,
     TAG_LABEL,
     TAG_RELATIVE,
@@ -71,9 +73,43 @@ VALID_TAGS = {
     TAG_UPLOADER,
     TAG_UPDATE_PR_BODY,
     TAG_BRANCH_FORMAT,
+})
+
+
+def singular_tag(tag: str) -> str:
+    """
+    Strip any plural ending from a lowercase tag name, except for tags that are never plural.
+    """
+    if (
+        not tag.startswith(TAG_RELATIVE)
+        and not tag.startswith(TAG_RELATIVE_BRANCH)
+        and not tag.startswith(TAG_TOPIC)
+        and not tag.startswith(TAG_UPLOADER)
+    ):
+        # That's right, plurals don't even have to be grammatically correct
+        if tag.endswith("ees"):
+            return tag[:-1]
+        elif tag.endswith("es"):
+            return tag[:-2]
+        elif tag.endswith("s"):
+            return tag[:-1]
+    return tag
+
+
+# Every lowercase spelling accepted for each valid tag, so a tag can be recognized with a single
+# lookup. singular_tag() never strips more than "es", so these are the only candidates.
+TAG_SPELLINGS = {
+    spelling: tag
+    for tag in VALID_TAGS
+    for spelling in (tag, tag + "s", tag + "es")
+    if singular_tag(spelling) == tag
 }
 
-RE_COMMIT_LABEL = re.compile(r"^(?P<label1>[a-zA-Z\-_0-9]+):.*|^\[(?P<label2>[a-zA-Z\-_0-9]+)\].*")
+# Only the label is used, so the match stops there rather than consuming the rest of the title
+RE_COMMIT_LABEL = re.compile(r"(?P<label1>[a-zA-Z\-_0-9]+):|\[(?P<label2>[a-zA-Z\-_0-9]+)\]")
+
+# Characters deleted from commit titles when they're used to generate a topic name
+AUTO_TOPIC_DELETE_CHARS = str.maketrans("", "", ":[]")
 
 PATCHSETS_FIRST_LINE = "| # | head | base | diff | date | summary |\r\n| - | - | - | - | - | - |"
 REVIEW_GRAPH_FIRST_LINE = "Reviews in this chain:\r\n"
@@ -91,7 +127,7 @@ def translate_if_exists(names: Set[str], translation: Dict[str, str]) -> Set[str
     """
     Return the translation entry for each name, only if it exists.
     """
-    return set(translation[name] for name in names if name in translation)
+    return {translation[name] for name in names & translation.keys()}
 
 
 # The current state of each review within github.
@@ -254,19 +290,32 @@ class TopicStack:
     # All virtual diff targets for the current upload are chained into a dummy branch
     last_virtual_diff_target: Optional[GitCommitHash] = None
 
+    # Virtual diff target that was last pushed, so pushing again doesn't repeat it
+    pushed_virtual_diff_target: Optional[GitCommitHash] = None
+
+    # Held while adding to the virtual diff target chain, so concurrent additions don't fork it
+    virtual_diff_target_lock: Optional[asyncio.Lock] = None
+
     # Whether populate() was successfully called
     populated: bool = False
 
     # Whether to work around github issues with reordering by pushing a dummy commit
     use_reordering_workaround = False
 
+    # Result of all_reviews_iter(), saved once populate_relative_reviews() has created all reviews
+    all_reviews: Optional[List[Tuple[str, Topic, str, Review]]] = None
+
     def all_reviews_iter(self) -> Iterator[Tuple[str, Topic, str, Review]]:
         """
         One liner for common iteration pattern to reduce indentation a bit.
         """
-        for name, topic in self.topological_topics():
-            for base_branch, review in topic.reviews.items():
-                yield name, topic, base_branch, review
+        if self.all_reviews is not None:
+            return iter(self.all_reviews)
+        return (
+            (name, topic, base_branch, review)
+            for name, topic in self.topological_topics()
+            for base_branch, review in topic.reviews.items()
+        )
 
     def topological_topics(self) -> Iterator[Tuple[str, Topic]]:
         """
@@ -288,36 +337,26 @@ class TopicStack:
         Tag parsing is fairly generous, tags can appear in any case and can accept plural forms
         Values are comma separated, and if a tag appears multiple times its values get combined
         """
-        ret = defaultdict(set)
+        ret: Dict[str, Set[str]] = defaultdict(set)
+        if ":" not in commit_msg:
+            # Every tag has a colon, so there's no need to run the regex
+            return ret, commit_msg.strip()
+        # Pieces of the message between the lines of recognized tags
         trimmed_msg = []
-        for ln in commit_msg.split("\n"):
-            m = RE_TAGS.match(ln)
-            if m is None:
-                trimmed_msg.append(ln)
-                continue
-            tag = m.group("tagname").lower().strip()
-            val = set(s.strip() for s in m.group("tagvalue").split(","))
-            if (
-                not tag.startswith(TAG_RELATIVE)
-                and not tag.startswith(TAG_RELATIVE_BRANCH)
-                and not tag.startswith(TAG_TOPIC)
-                and not tag.startswith(TAG_UPLOADER)
-            ):
-                # That's right, plurals don't even have to be grammatically correct
-                if tag.endswith("ees"):
-                    tag = tag[:-1]
-                elif tag.endswith("es"):
-                    tag = tag[:-2]
-                elif tag.endswith("s"):
-                    tag = tag[:-1]
-            val.discard("")  # Discards any whitespace only values, since it was stripped prior
-            if tag in VALID_TAGS:
+        pos = 0
+        for m in RE_TAGS.finditer(commit_msg):
+            tag = TAG_SPELLINGS.get(m.group("tagname").lower())
+            if tag is not None:
+                val = set(s.strip() for s in m.group("tagvalue").split(","))
+                val.discard("")  # Discards any whitespace only values, since it was stripped prior
                 if tag in (TAG_BRANCH, TAG_RELATIVE_BRANCH):
                     val = set(self.git_ctx.ensure_branch_prefix(b) for b in val)
                 ret[tag].update(val)
-            else:
-                trimmed_msg.append(ln)
-        return ret, "\n".join(trimmed_msg).strip()
+                # Drop the line along with its newline
+                trimmed_msg.append(commit_msg[pos : m.start()])
+                pos = m.end() + 1
+        trimmed_msg.append(commit_msg[pos:])
+        return ret, "".join(trimmed_msg).strip()
 
     async def create_patchsets_comment(
         self, review: Review, orig: Optional[PrComment]
@@ -358,16 +397,19 @@ class TopicStack:
                 diff_base = review.base_ref
             elif review.base_ref != review.pr_info.baseRefOid:
                 # Rebased review, make a virtual diff target
-                if self.last_virtual_diff_target is None:
-                    self.last_virtual_diff_target = GitCommitHash(self.base_branch)
-                self.last_virtual_diff_target = await self.git_ctx.make_virtual_diff_target(
-                    review.pr_info.baseRefOid,
-                    review.pr_info.headRefOid,
-                    review.base_ref,
-                    review.new_commits[-1],
-                    self.last_virtual_diff_target,
-                )
-                diff_base = self.last_virtual_diff_target
+                if self.virtual_diff_target_lock is None:
+                    self.virtual_diff_target_lock = asyncio.Lock()
+                async with self.virtual_diff_target_lock:
+                    if self.last_virtual_diff_target is None:
+                        self.last_virtual_diff_target = GitCommitHash(self.base_branch)
+                    self.last_virtual_diff_target = await self.git_ctx.make_virtual_diff_target(
+                        review.pr_info.baseRefOid,
+                        review.pr_info.headRefOid,
+                        review.base_ref,
+                        review.new_commits[-1],
+                        self.last_virtual_diff_target,
+                    )
+                    diff_base = self.last_virtual_diff_target
             else:
                 # Non rebase push, diff against previous version of the branch
                 diff_base = review.pr_info.headRefOid
@@ -375,7 +417,11 @@ class TopicStack:
                 f"[diff](/{self.fork_info.owner}/{self.repo_info.name}/compare/"
                 f"{diff_base}..{review.new_commits[-1]})"
             )
-            summary = await self.git_ctx.get_diff_summary(diff_base, review.new_commits[-1])
+            if diff_base == review.new_commits[-1]:
+                # Comparing a commit to itself can't change anything
+                summary = ""
+            else:
+                summary = await self.git_ctx.get_diff_summary(diff_base, review.new_commits[-1])
             if not summary:
                 summary = "0 files changed"
         else:
@@ -448,7 +494,7 @@ class TopicStack:
                     parsed_tags[TAG_TOPIC].add(
                         "_".join(
                             trimmed_msg.split("\n", maxsplit=1)[0].lower().split()[:5]
-                        ).translate({ord(":"): None, ord("["): None, ord("]"): None})
+                        ).translate(AUTO_TOPIC_DELETE_CHARS)
                     )
                 else:
                     # No topic tags, not a revup commit
@@ -462,7 +508,7 @@ class TopicStack:
             else:
                 if trim_tags:
                     c.commit_msg = trimmed_msg
-                name = min(parsed_tags[TAG_TOPIC])
+                name = next(iter(parsed_tags[TAG_TOPIC]))
                 if raise_on_invalid and not RE_BRANCH_ALLOWED.match(name):
                     raise RevupUsageException(f"Invalid characters in topic name '{name}'")
                 if name not in self.topics:
@@ -543,7 +589,7 @@ class TopicStack:
                 # If the topic doesn't specify base branches, it will automatically get
                 # all the base branches for the relative topic. However it can't specify
                 # any base branches the relative topic doesn't have.
-                relative_topic = min(topic.tags[TAG_RELATIVE])
+                relative_topic = next(iter(topic.tags[TAG_RELATIVE]))
                 if relative_topic not in self.topics:
                     logging.warning(
                         f"Relative topic '{relative_topic}' not found in stack, assuming it was"
@@ -653,7 +699,9 @@ class TopicStack:
                     f" {topic.tags[TAG_BRANCH]} for topic {name}"
                 )
 
-            topic_uploader = min(topic.tags[TAG_UPLOADER]) if topic.tags[TAG_UPLOADER] else uploader
+            topic_uploader = (
+                next(iter(topic.tags[TAG_UPLOADER])) if topic.tags[TAG_UPLOADER] else uploader
+            )
             topic_branch_format = (
                 min(topic.tags[TAG_BRANCH_FORMAT]).lower()
                 if TAG_BRANCH_FORMAT in topic.tags
@@ -668,7 +716,9 @@ class TopicStack:
                 review = Review(topic)
                 # Track whether we need to query for the relative pr
                 review.relative_branch = (
-                    min(topic.tags[TAG_RELATIVE_BRANCH]) if topic.tags[TAG_RELATIVE_BRANCH] else ""
+                    next(iter(topic.tags[TAG_RELATIVE_BRANCH]))
+                    if topic.tags[TAG_RELATIVE_BRANCH]
+                    else ""
                 )
                 # Don't query if relative and base branch are the same
                 if review.relative_branch == branch:
@@ -699,14 +749,77 @@ class TopicStack:
             # Don't add draft as a label since its instead used to mark a pr as a draft
             topic.tags[TAG_LABEL].discard("draft")
 
+        # Reviews and the relationships between topics don't change from here on, so later passes
+        # don't need to sort the topics again
+        self.all_reviews = list(self.all_reviews_iter())
+
+    async def load_patch_ids(self) -> None:
+        """
+        Load the patch-ids of the local commits of all topics at once. These only depend on local
+        commits, so unlike load_remote_commits() this doesn't need to wait for the github query.
+        """
+        topics = [topic for topic in self.topics.values() if not topic.patch_ids]
+        patch_ids = iter(
+            await self.git_ctx.get_patch_ids(
+                [c.commit_id for topic in topics for c in topic.original_commits]
+            )
+        )
+        for topic in topics:
+            topic.patch_ids = list(islice(patch_ids, len(topic.original_commits)))
+
+    async def load_remote_commits(
+        self,
+    ) -> Dict[Tuple[str, str], Tuple[List[git.CommitHeader], List[str]]]:
+        """
+        Load the remote commits of all existing reviews along with their patch-ids, keyed by the
+        head and base of the review. Patch-ids of the local commits of those reviews' topics are
+        loaded as well. The rev-lists run concurrently, and all patch-ids are computed at once.
+        """
+        ranges: List[Tuple[str, str]] = []
+        topics: Dict[str, Topic] = {}
+        for name, topic, _, review in self.all_reviews_iter():
+            if review.pr_info is None:
+                continue
+            head, base = review.pr_info.headRefOid, review.pr_info.baseRefOid
+            if head and base and (head, base) not in ranges:
+                ranges.append((head, base))
+            if not topic.patch_ids:
+                topics[name] = topic
+
+        # Limits the number of rev-lists, and thus git processes, running at once
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+
+        async def load_range(head: str, base: str) -> List[git.CommitHeader]:
+            async with semaphore:
+                return git.parse_rev_list(
+                    await self.git_ctx.rev_list(head, base, header=True, first_parent=True)
+                )
+
+        remote_commits = await asyncio.gather(*(load_range(head, base) for head, base in ranges))
+
+        patch_ids = iter(
+            await self.git_ctx.get_patch_ids(
+                [c.commit_id for topic in topics.values() for c in topic.original_commits]
+                + [c.commit_id for commits in remote_commits for c in commits]
+            )
+        )
+        for topic in topics.values():
+            topic.patch_ids = list(islice(patch_ids, len(topic.original_commits)))
+        return {
+            key: (commits, list(islice(patch_ids, len(commits))))
+            for key, commits in zip(ranges, remote_commits)
+        }
+
     async def mark_rebases(self, skip_rebase: bool) -> None:
         """
         Scan all topics and compare patch-ids to remote patch-ids. Appropriately mark any
         changes that are already merged, or where push can be skipped due to being rebases or
         being identical.
         """
+        remote_commits = await self.load_remote_commits()
         num_reordered_changes = 0
         for _, topic, base_branch, review in self.all_reviews_iter():
+            base_branch_name = self.git_ctx.remove_branch_prefix(base_branch)
             # If the relative branch already merged, reset the remote base directly to the base
             # branch.
             if review.relative_branch:
@@ -725,7 +838,7 @@ class TopicStack:
                             review.base_ref = self.commits[0].parents[0]
                         else:
                             review.base_ref = await self.git_ctx.to_commit_hash(base_branch)
-                        review.remote_base = self.git_ctx.remove_branch_prefix(base_branch)
+                        review.remote_base = base_branch_name
 
             # If the relative topic was already merged, reset to the base branch.
             # We know at this point that any relative branch would have already merged.
@@ -733,14 +846,14 @@ class TopicStack:
                 topic.relative_topic is not None
                 and topic.relative_topic.reviews[base_branch].status == PrStatus.MERGED
             ):
-                review.remote_base = self.git_ctx.remove_branch_prefix(base_branch)
+                review.remote_base = base_branch_name
 
             # At this point we should have resolved the correct base branch. If the review
             # was actually merged into a different branch, warn and try to create it again.
             if (
                 review.status == PrStatus.MERGED
                 and review.pr_info is not None
-                and self.git_ctx.remove_branch_prefix(base_branch) != review.pr_info.baseRef
+                and base_branch_name != review.pr_info.baseRef
             ):
                 logging.warning(
                     f"Branch {review.remote_head} was merged into {review.pr_info.baseRef} "
@@ -777,30 +890,13 @@ class TopicStack:
                 assert (
                     review.pr_info.baseRefOid is not None and review.pr_info.headRefOid is not None
                 )
-                if not topic.patch_ids:
-                    # Lazily load patch ids for the topic.
-                    topic.patch_ids = await asyncio.gather(
-                        *(self.git_ctx.get_patch_id(c.commit_id) for c in topic.original_commits)
-                    )
-
-                review.remote_commits = git.parse_rev_list(
-                    await self.git_ctx.rev_list(
-                        review.pr_info.headRefOid,
-                        review.pr_info.baseRefOid,
-                        header=True,
-                        first_parent=True,
-                    )
-                )
+                review.remote_commits, review.remote_patch_ids = remote_commits[
+                    (review.pr_info.headRefOid, review.pr_info.baseRefOid)
+                ]
 
-                review.remote_patch_ids = await asyncio.gather(
-                    *(self.git_ctx.get_patch_id(c.commit_id) for c in review.remote_commits)
-                )
-
-                # This review is a rebase iff all commit diffs match
-                is_rebase = len(review.remote_commits) == len(topic.original_commits) and all(
-                    local_id == remote_id
-                    for local_id, remote_id in zip(topic.patch_ids, review.remote_patch_ids)
-                )
+                # This review is a rebase iff all commit diffs match. Patch-ids are aligned with
+                # the commits, so comparing the lists also compares the number of commits.
+                is_rebase = topic.patch_ids == review.remote_patch_ids
                 # This review is a "complete rebase" iff all commit diffs and metadata match
                 review.is_pure_rebase = is_rebase and all(
                     git.commits_match(local_commit, remote_commit)
@@ -823,21 +919,26 @@ class TopicStack:
                             f"Review for {topic.name} was reworded but has already been merged"
                         )
                         review.is_pure_rebase = True
-                    else:
-                        # TODO: We can do more optimization by reusing the remote trees.
-                        # We wouldn't benefit as much from skipping the push, but we'd save time
-                        # on creating commits.
-                        pass
+                    # Otherwise the reworded commits still need to be pushed, but create_commits
+                    # reuses the remote trees rather than cherry-picking them again.
 
             if review.is_pure_rebase and review.pr_info is not None:
+                # None if the base was never checked because the answer couldn't matter
+                is_on_correct_base: Optional[bool] = None
                 if topic.relative_topic is None:
                     if not review.base_ref:
                         raise RuntimeError("Review doesn't have a base ref!")
                     # For non-relative reviews, the base is correct if the remote base commit is a
-                    # first-parent ancestor of the local remote base.
-                    is_on_correct_base = await self.git_ctx.is_ancestor(
-                        review.remote_commits[0].parents[0], review.base_ref
-                    )
+                    # first-parent ancestor of the local remote base. Checking that walks history,
+                    # so it's only done when the answer can affect the push status below.
+                    if (
+                        skip_rebase
+                        and review.status != PrStatus.MERGED
+                        and review.base_ref != review.remote_commits[0].parents[0]
+                    ):
+                        is_on_correct_base = await self.git_ctx.is_ancestor(
+                            review.remote_commits[0].parents[0], review.base_ref
+                        )
                 else:
                     # For a relative series of reviews, revup will only ever upload them directly
                     # on top of each other. If this relationship is ever broken, we always reupload
@@ -860,7 +961,7 @@ class TopicStack:
                     "Review {}/{} is correct base {} relative nochange {} skippable {}".format(
                         base_branch,
                         topic.name,
-                        is_on_correct_base,
+                        "unchecked" if is_on_correct_base is None else is_on_correct_base,
                         relative_topic_is_nochange,
                         relative_topic_is_skippable,
                     )
@@ -920,78 +1021,165 @@ class TopicStack:
     async def create_commits(self, trim_tags: bool) -> None:
         """
         Populate new_commits for all reviews by cherry-picking to the base ref if necessary.
+        Reviews are created concurrently, with each one only waiting on its relative review.
         """
+        # Limits the number of cherry-picks, and thus git processes, running at once
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        tasks: Dict[Tuple[str, str], asyncio.Future[None]] = {}
+        # Topological order ensures the task for a relative review is always created first
         for name, topic, base_branch, review in self.all_reviews_iter():
-            if review.push_status != PushStatus.PUSHED:
-                # Don't need to create branches if we're not pushing them.
-                continue
+            tasks[(name, base_branch)] = asyncio.ensure_future(
+                self.create_review_commits(
+                    name,
+                    topic,
+                    base_branch,
+                    review,
+                    trim_tags,
+                    (
+                        tasks[(topic.relative_topic.name, base_branch)]
+                        if topic.relative_topic is not None
+                        else None
+                    ),
+                    semaphore,
+                )
+            )
 
-            if topic.relative_topic is not None:
-                if not topic.relative_topic.reviews[base_branch].new_commits:
-                    raise RuntimeError(
-                        f"Bug! Relative topic {topic.relative_topic.name} is missing commits "
-                        f"(status {topic.relative_topic.reviews[base_branch].push_status})"
-                    )
-                # The base ref for this topic is the last commit in the relative topic
-                review.base_ref = topic.relative_topic.reviews[base_branch].new_commits[-1]
+        # Let every task finish so that the reported error is the first one in stack order, which
+        # is what it would be if the reviews were created one at a time
+        for result in await asyncio.gather(*tasks.values(), return_exceptions=True):
+            if isinstance(result, BaseException):
+                if isinstance(result, RevupConflictException) and isinstance(
+                    result.__cause__, GitConflictException
+                ):
+                    await self.git_ctx.dump_conflict(result.__cause__)
+                raise result
 
-            if not review.base_ref:
-                raise RuntimeError("Bug! review doesn't have a base ref")
+    async def create_review_commits(
+        self,
+        name: str,
+        topic: Topic,
+        base_branch: str,
+        review: Review,
+        trim_tags: bool,
+        relative_task: Optional[asyncio.Future[None]],
+        semaphore: asyncio.Semaphore,
+    ) -> None:
+        """
+        Populate new_commits for a single review, once its relative review (if any) is done.
+        """
+        if relative_task is not None:
+            await relative_task
 
-            next_parent = review.base_ref
-            for commit in topic.original_commits:
-                if commit.parents[0] == next_parent and not trim_tags:
-                    # If the intended parent is the same as the actual parent, skip the
-                    # cherry-pick process (unless the commit msg needs to change).
-                    review.new_commits.append(commit.commit_id)
-                    next_parent = commit.commit_id
-                else:
-                    # TODO: Potential optimization here: if remote_base_oid and base_ref are
-                    # the same, we can use trees to pick the first N commits where patch-id
-                    # is equal to remote patch-id
-                    # TODO: We can parallelize independent chains of commit creation
-                    try:
+        if review.push_status != PushStatus.PUSHED:
+            # Don't need to create branches if we're not pushing them.
+            return
+
+        if topic.relative_topic is not None:
+            if not topic.relative_topic.reviews[base_branch].new_commits:
+                raise RuntimeError(
+                    f"Bug! Relative topic {topic.relative_topic.name} is missing commits "
+                    f"(status {topic.relative_topic.reviews[base_branch].push_status})"
+                )
+            # The base ref for this topic is the last commit in the relative topic
+            review.base_ref = topic.relative_topic.reviews[base_branch].new_commits[-1]
+
+        if not review.base_ref:
+            raise RuntimeError("Bug! review doesn't have a base ref")
+
+        next_parent = review.base_ref
+        # Whether next_parent has the same tree as the parent of the remote commit at the same
+        # position. While this holds, a commit with the same patch-id as that remote commit would
+        # be cherry-picked to the remote commit's tree, so the tree can be reused without merging.
+        matches_remote = (
+            bool(review.remote_commits) and review.remote_commits[0].parents[0] == next_parent
+        )
+        # Whether each commit's diff matches the remote commit at the same position including line
+        # numbers, which patch-ids leave out. Only loaded once a remote tree might be reused.
+        diffs_match: Optional[List[bool]] = None
+        for i, commit in enumerate(topic.original_commits):
+            matches_remote = (
+                matches_remote
+                and i < len(review.remote_commits)
+                and topic.patch_ids[i] == review.remote_patch_ids[i]
+            )
+            on_intended_parent = commit.parents[0] == next_parent
+            if matches_remote and not on_intended_parent:
+                # The same change at different lines (for example in a duplicated block) has the
+                # same patch-id but gives a different tree, so check the diffs really match
+                # before reusing the remote tree.
+                if diffs_match is None:
+                    pairs = list(zip(topic.original_commits, review.remote_commits))
+                    async with semaphore:
+                        fingerprints = await self.git_ctx.get_diff_fingerprints(
+                            [local.commit_id for local, _ in pairs]
+                            + [remote.commit_id for _, remote in pairs]
+                        )
+                    diffs_match = [
+                        local == remote
+                        for local, remote in zip(fingerprints, fingerprints[len(pairs) :])
+                    ]
+                matches_remote = all(diffs_match[: i + 1])
+            if on_intended_parent and not trim_tags:
+                # If the intended parent is the same as the actual parent, skip the
+                # cherry-pick process (unless the commit msg needs to change).
+                review.new_commits.append(commit.commit_id)
+                next_parent = commit.commit_id
+            elif on_intended_parent or matches_remote:
+                # The tree is already known, so only a new commit object is needed
+                async with semaphore:
+                    next_parent = await self.git_ctx.cherry_pick_from_tree(
+                        (
+                            commit
+                            if on_intended_parent
+                            else replace(commit, tree=review.remote_commits[i].tree)
+                        ),
+                        next_parent,
+                    )
+                review.new_commits.append(next_parent)
+            else:
+                try:
+                    async with semaphore:
                         next_parent = await self.git_ctx.synthetic_cherry_pick_from_commit(
                             commit, next_parent
                         )
-                    except GitConflictException as exc:
-                        parent_info = (
-                            "the same topic"
-                            if next_parent != review.base_ref
-                            else (
-                                f'relative topic "{topic.relative_topic.name}"'
-                                if topic.relative_topic
-                                else f'base branch "{base_branch}"'
-                            )
+                except GitConflictException as exc:
+                    parent_info = (
+                        "the same topic"
+                        if next_parent != review.base_ref
+                        else (
+                            f'relative topic "{topic.relative_topic.name}"'
+                            if topic.relative_topic
+                            else f'base branch "{base_branch}"'
                         )
-                        await self.git_ctx.dump_conflict(exc)
-                        raise RevupConflictException(
-                            commit,
-                            next_parent,
-                            "You must specify relative branches to prevent this conflict!",
-                            f' in topic "{name}"',
-                            f" in {parent_info}",
-                        ) from exc
-                    review.new_commits.append(next_parent)
-
-            if review.pr_info is not None and review.pr_info.headRefOid == review.new_commits[-1]:
-                # There are a few cases where we might not know a review is no change until after
-                # creating commits:
-                # 1. The relative PR was closed without merging after being uploaded. We don't look
-                # at closed PRs, so we don't know whether that branch has changed. However actually
-                # building both branches could reveal that the resulting commit is the same.
-                # 2. A commit might not match the remote based on patch id, but applying the patch
-                # would result in the same commit as the remote. This could happen if a part of the
-                # patch is dependent on a local commit, but is a no-op when applied to the base.
-                review.push_status = PushStatus.NOCHANGE
-                if review.status == PrStatus.NEW:
-                    # A PR marked as new but with a pr_info must have previously been merged, but
-                    # marked as new when checking rebases. Return it to merged.
-                    review.status = PrStatus.MERGED
-                # TODO: If 2 above were true *and* a rebase occurred this wouldn't catch it and
-                # an erroneous push / pr creation would happen. We'd have to compute patch ids again
-                # to catch this which is a bit inefficient for all reviews. Lets see how common this
-                # is / try to think of alternative solutions.
+                    )
+                    # The conflict is dumped by create_commits if this is the one it reports
+                    raise RevupConflictException(
+                        commit,
+                        next_parent,
+                        "You must specify relative branches to prevent this conflict!",
+                        f' in topic "{name}"',
+                        f" in {parent_info}",
+                    ) from exc
+                review.new_commits.append(next_parent)
+
+        if review.pr_info is not None and review.pr_info.headRefOid == review.new_commits[-1]:
+            # There are a few cases where we might not know a review is no change until after
+            # creating commits:
+            # 1. The relative PR was closed without merging after being uploaded. We don't look
+            # at closed PRs, so we don't know whether that branch has changed. However actually
+            # building both branches could reveal that the resulting commit is the same.
+            # 2. A commit might not match the remote based on patch id, but applying the patch
+            # would result in the same commit as the remote. This could happen if a part of the
+            # patch is dependent on a local commit, but is a no-op when applied to the base.
+            review.push_status = PushStatus.NOCHANGE
+            if review.status == PrStatus.NEW:
+                # A PR marked as new but with a pr_info must have previously been merged, but
+                # marked as new when checking rebases. Return it to merged.
+                review.status = PrStatus.MERGED
+            # TODO: If 2 above were true *and* a rebase occurred this wouldn't catch it and
+            # an erroneous push / pr creation would happen. We'd have to compute patch ids again
+            # to catch this which is a bit inefficient for all reviews. Lets see how common this
+            # is / try to think of alternative solutions.
 
     async def fetch_git_refs(self) -> None:
         """
@@ -1002,18 +1190,27 @@ class TopicStack:
         if not self.github_ep or not self.repo_info:
             raise RuntimeError("Can't fetch without github info")
 
-        to_fetch = set()
-        for _, _, _, review in self.all_reviews_iter():
-            if (
-                review.pr_info is not None
-                and review.pr_info.headRefOid is not None
-                and not await self.git_ctx.is_branch_or_commit(review.pr_info.headRefOid)
-            ):
-                to_fetch.add(review.pr_info.headRefOid)
+        head_oids = list(
+            dict.fromkeys(
+                review.pr_info.headRefOid
+                for _, _, _, review in self.all_reviews_iter()
+                if review.pr_info is not None and review.pr_info.headRefOid is not None
+            )
+        )
+        # Check for all the heads with a single batch lookup
+        to_fetch = [
+            oid
+            for oid, found in zip(
+                head_oids, await self.git_ctx.cat_files([f"{oid}^{{commit}}" for oid in head_oids])
+            )
+            if found is None
+        ]
 
         if to_fetch:
+            # Tags are never needed here, so skip following them
             fetch_args = [
                 "fetch",
+                "--no-tags",
                 "--no-write-fetch-head",
                 "--no-auto-maintenance",
                 "--quiet" if self.git_ctx.sh.quiet else "--verbose",
@@ -1030,6 +1227,7 @@ class TopicStack:
             raise RuntimeError("Can't push without github info")
 
         push_targets = []
+        local_branch_updates = []
         for _, _, _, review in self.all_reviews_iter():
             if review.push_status != PushStatus.PUSHED or review.status == PrStatus.MERGED:
                 continue
@@ -1053,15 +1251,24 @@ class TopicStack:
             push_targets.append(f"{commit_to_push}:refs/heads/{review.remote_head}")
 
             if create_local_branches:
-                await self.git_ctx.git(
-                    "update-ref",
-                    "-m",
-                    "revup: update local branch",
-                    review.remote_head,
-                    review.new_commits[-1],
+                local_branch_updates.append(
+                    f"update {review.remote_head} {review.new_commits[-1]}\n"
                 )
 
-        if self.last_virtual_diff_target is not None:
+        if local_branch_updates:
+            # Update all the local branches with a single command
+            await self.git_ctx.git(
+                "update-ref",
+                "-m",
+                "revup: update local branch",
+                "--stdin",
+                input_str="".join(local_branch_updates),
+            )
+
+        if (
+            self.last_virtual_diff_target is not None
+            and self.last_virtual_diff_target != self.pushed_virtual_diff_target
+        ):
             virtual_diff_branch = f"{uploader}/revup/virtual_diff_targets"
             push_targets.append(f"{self.last_virtual_diff_target}:refs/heads/{virtual_diff_branch}")
 
@@ -1085,6 +1292,7 @@ class TopicStack:
                     b"" if (l.startswith(b"remote: ") and self.git_ctx.sh.quiet) else l
                 ),
             )
+            self.pushed_virtual_diff_target = self.last_virtual_diff_target
 
     async def query_github(self) -> None:
         """
@@ -1096,20 +1304,20 @@ class TopicStack:
             raise RuntimeError("Can't query without github info")
 
         pr_targets = []
+        relative_targets = set()
         user_ids = set()
         labels = set()
         for _, topic, base_branch, review in self.all_reviews_iter():
             pr_targets.append(review.remote_head)
+            if review.relative_branch:
+                relative_targets.add(self.git_ctx.remove_branch_prefix(review.relative_branch))
             user_ids |= topic.tags[TAG_REVIEWER]
             user_ids |= topic.tags[TAG_ASSIGNEE]
             labels |= topic.tags[TAG_LABEL]
             labels.add(self.git_ctx.remove_branch_prefix(base_branch))
 
-        relative_targets = set()
         # Add queries for relative branches at the end
-        for _, topic, _, review in self.all_reviews_iter():
-            if review.relative_branch:
-                relative_targets.add(self.git_ctx.remove_branch_prefix(review.relative_branch))
+        num_reviews = len(pr_targets)
         pr_targets.extend(relative_targets)
 
         # Queries currently cannot be mixed with mutations. However we can save
@@ -1124,20 +1332,16 @@ class TopicStack:
             self.github_ep, self.repo_info, pr_targets, list(user_ids), list(labels)
         )
 
-        i = 0
-        for _, _, _, review in self.all_reviews_iter():
-            review.pr_info = prs[i]
+        for (_, _, _, review), pr_info in zip(self.all_reviews_iter(), prs):
+            review.pr_info = pr_info
             if review.pr_info is None:
                 review.status = PrStatus.NEW
             elif review.pr_info.state == "MERGED":
                 review.status = PrStatus.MERGED
-            i += 1
 
-        while i < len(pr_targets):
-            pr_info = prs[i]
+        for target, pr_info in zip(relative_targets, islice(prs, num_reviews, None)):
             if pr_info is not None:
-                self.relative_infos[pr_targets[i]] = pr_info
-            i += 1
+                self.relative_infos[target] = pr_info
 
     def populate_update_info(
         self,
@@ -1152,9 +1356,17 @@ class TopicStack:
             raise RuntimeError("Need to query before updating")
 
         for topic in self.topics.values():
-            commit_msg_lines = topic.original_commits[0].commit_msg.split("\n")
-            body = "\n".join(commit_msg_lines[1:]).strip()
-            title = commit_msg_lines[0]
+            title, _, body = topic.original_commits[0].commit_msg.partition("\n")
+            body = body.strip()
+            # These only depend on the topic, so they're shared by all of its reviews
+            topic_reviewer_ids = translate_if_exists(topic.tags[TAG_REVIEWER], self.names_to_ids)
+            topic_assignee_ids = translate_if_exists(topic.tags[TAG_ASSIGNEE], self.names_to_ids)
+            topic_label_ids = translate_if_exists(topic.tags[TAG_LABEL], self.labels_to_ids)
+            if TAG_UPDATE_PR_BODY in topic.tags:
+                update_pr_body = min(topic.tags[TAG_UPDATE_PR_BODY]).lower() == "true"
+            else:
+                update_pr_body = update_pr_body_arg
+
             for branch, review in topic.reviews.items():
                 if review.status == PrStatus.NEW:
                     if not review.base_ref:
@@ -1175,49 +1387,39 @@ class TopicStack:
                 if not review.pr_info or review.status == PrStatus.MERGED:
                     continue
 
-                for i in range(github_utils.MAX_COMMENTS_TO_QUERY):
-                    # Match comment indexes for various features (they will be populated later)
-                    if i >= len(review.pr_info.comments):
-                        if review.review_graph_index is None:
-                            review.review_graph_index = i
-                        elif review.patchsets_index is None:
-                            review.patchsets_index = i
-                    elif review.pr_info.comments[i].text.startswith(REVIEW_GRAPH_FIRST_LINE):
+                # Match comment indexes for various features (they will be populated later)
+                num_comments = len(review.pr_info.comments)
+                for i, comment in enumerate(
+                    islice(review.pr_info.comments, github_utils.MAX_COMMENTS_TO_QUERY)
+                ):
+                    if comment.text.startswith(REVIEW_GRAPH_FIRST_LINE):
+                        review.review_graph_index = i
+                    elif comment.text.startswith(PATCHSETS_FIRST_LINE):
+                        review.patchsets_index = i
+                # Features without an existing comment take the following empty slots
+                for i in range(num_comments, github_utils.MAX_COMMENTS_TO_QUERY):
+                    if review.review_graph_index is None:
                         review.review_graph_index = i
-                    elif review.pr_info.comments[i].text.startswith(PATCHSETS_FIRST_LINE):
+                    elif review.patchsets_index is None:
                         review.patchsets_index = i
+                    else:
+                        break
 
-                labels = set(topic.tags[TAG_LABEL])
+                labels = topic.tags[TAG_LABEL]
+                label_ids = topic_label_ids
                 base_branch_name = self.git_ctx.remove_branch_prefix(branch)
                 if base_branch_name in self.labels_to_ids:
                     # Add the base branch name as a tag which can show all changes on that branch
-                    labels.add(base_branch_name)
+                    labels = labels | {base_branch_name}
+                    label_ids = label_ids | {self.labels_to_ids[base_branch_name]}
 
-                label_ids = translate_if_exists(labels, self.labels_to_ids).difference(
-                    review.pr_info.label_ids
-                )
-                valid_labels = set(label for label in labels if label in self.labels_to_ids)
+                label_ids = label_ids.difference(review.pr_info.labels.values())
 
                 # Don't request reviewers that are already added, otherwise the request will clear
                 # the "reviewed" status in the UI.
-                reviewer_ids = translate_if_exists(
-                    topic.tags[TAG_REVIEWER], self.names_to_ids
-                ).difference(review.pr_info.reviewer_ids)
-                reviewer_logins = translate_if_exists(
-                    topic.tags[TAG_REVIEWER], self.names_to_logins
-                ).difference(review.pr_info.reviewers)
-
-                assignee_ids = translate_if_exists(
-                    topic.tags[TAG_ASSIGNEE], self.names_to_ids
-                ).difference(review.pr_info.assignee_ids)
-                assignee_logins = translate_if_exists(
-                    topic.tags[TAG_ASSIGNEE], self.names_to_logins
-                ).difference(review.pr_info.assignees)
-
-                if TAG_UPDATE_PR_BODY in topic.tags:
-                    update_pr_body = min(topic.tags[TAG_UPDATE_PR_BODY]).lower() == "true"
-                else:
-                    update_pr_body = update_pr_body_arg
+                reviewer_ids = topic_reviewer_ids.difference(review.pr_info.reviewers.values())
+
+                assignee_ids = topic_assignee_ids.difference(review.pr_info.assignees.values())
 
                 if review.pr_info.baseRef != review.remote_base:
                     review.pr_update.baseRef = review.remote_base
@@ -1231,37 +1433,50 @@ class TopicStack:
                 review.pr_update.reviewer_ids = reviewer_ids
                 review.pr_update.assignee_ids = assignee_ids
 
-                review.pr_info.reviewers |= reviewer_logins
-                review.pr_info.assignees |= assignee_logins
-                review.pr_info.labels |= valid_labels
+                review.pr_info.reviewers.update(
+                    (self.names_to_logins[name], self.names_to_ids[name])
+                    for name in topic.tags[TAG_REVIEWER]
+                    if name in self.names_to_logins
+                )
+                review.pr_info.assignees.update(
+                    (self.names_to_logins[name], self.names_to_ids[name])
+                    for name in topic.tags[TAG_ASSIGNEE]
+                    if name in self.names_to_logins
+                )
+                review.pr_info.labels.update(
+                    (label, self.labels_to_ids[label])
+                    for label in labels
+                    if label in self.labels_to_ids
+                )
 
-    def create_review_graph(self) -> Dict[str, List[str]]:
+    def create_review_graph(self) -> Dict[str, Tuple[List[str], int]]:
         """
-        Return a dict of remote branch names to a string containing a graph-formatted
-        representation of the entire relative review structure in that chain.
+        Return a dict of remote branch names to the lines of a graph-formatted representation of
+        the entire relative review structure in that chain, along with the index of the line for
+        that branch's review.
         """
-        ret: Dict[str, List[str]] = {}
+        ret: Dict[str, Tuple[List[str], int]] = {}
 
-        def graph_helper(review: Review, back: str, prefix: str) -> int:
+        def graph_helper(review: Review, back: str, prefix: str, lines: List[str]) -> int:
             if review.pr_info is None:
                 return 0
             review_title = review.pr_update.title or review.pr_info.title
             num_nodes = 1
-            ret[review.remote_head][0] += f"{back}{prefix}{review.pr_info.url} {review_title}\n"
+            # All members of the chain reference the same list of lines
+            ret[review.remote_head] = (lines, len(lines))
+            lines.append(f"{back}{prefix}{review.pr_info.url} {review_title}\n")
             for i, child in enumerate(review.children):
-                ret[child.remote_head] = ret[review.remote_head]
                 num_nodes += graph_helper(
                     child,
                     back + ("\u3000" if prefix == "└" else "│"),
                     ("└" if i == len(review.children) - 1 else "├"),
+                    lines,
                 )
             return num_nodes
 
         for _, topic, _, review in self.all_reviews_iter():
             if topic.relative_topic is None:
-                # Uses a single element list so all members of the chain reference the same string.
-                ret[review.remote_head] = [""]
-                graph_helper(review, "", "└")
+                graph_helper(review, "", "└", [])
 
         return ret
 
@@ -1276,12 +1491,17 @@ class TopicStack:
             ):
                 continue
             review_title = review.pr_update.title or review.pr_info.title
-            review_graph_text = REVIEW_GRAPH_FIRST_LINE + (
-                review_graph[review.remote_head][0].replace(
+            lines, index = review_graph[review.remote_head]
+            # Only this review's own line needs to be highlighted
+            review_graph_text = "".join([
+                REVIEW_GRAPH_FIRST_LINE,
+                *lines[:index],
+                lines[index].replace(
                     f"{review.pr_info.url} {review_title}",
                     f"**{review.pr_info.url} {review_title}**",
-                )
-            )
+                ),
+                *lines[index + 1 :],
+            ])
             if len(review.pr_info.comments) > review.review_graph_index:
                 if review_graph_text != review.pr_info.comments[review.review_graph_index].text:
                     # edit existing comment
@@ -1296,24 +1516,32 @@ class TopicStack:
                 review.pr_update.comments.insert(0, PrComment(review_graph_text, None))
 
     async def populate_patchsets(self) -> None:
-        for _, _, _, review in self.all_reviews_iter():
+        # Limits the number of comments, and thus git processes, being created at once
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+
+        async def populate_patchset(review: Review) -> None:
             if (
                 review.patchsets_index is None
                 or not review.pr_info
                 or review.status == PrStatus.MERGED
             ):
-                continue
-            patchsets_comment = await self.create_patchsets_comment(
-                review,
-                (
-                    review.pr_info.comments[review.patchsets_index]
-                    if len(review.pr_info.comments) > review.patchsets_index
-                    else None
-                ),
-            )
+                return
+            async with semaphore:
+                patchsets_comment = await self.create_patchsets_comment(
+                    review,
+                    (
+                        review.pr_info.comments[review.patchsets_index]
+                        if len(review.pr_info.comments) > review.patchsets_index
+                        else None
+                    ),
+                )
             if patchsets_comment:
                 review.pr_update.comments.append(patchsets_comment)
 
+        await asyncio.gather(
+            *(populate_patchset(review) for _, _, _, review in self.all_reviews_iter())
+        )
+
     async def create_prs(self) -> None:
         """
         Actually perform the github graphql PR creation
@@ -1371,23 +1599,40 @@ class TopicStack:
         Create a new commit chain consisting of current commits but with commits
         in a single topic consolidated together.
         """
+        # Trees of the commits are known from parsing them, so only the trees of parents outside
+        # the stack need to be looked up, which is done in a single batch
+        trees = {commit.commit_id: commit.tree for commit in self.commits}
+        outside_parents = list(
+            {commit.parents[0] for commit in self.commits if commit.parents[0] not in trees}
+        )
+        for parent, found in zip(
+            outside_parents,
+            await self.git_ctx.cat_files([f"{parent}^{{tree}}" for parent in outside_parents]),
+        ):
+            if found is None:
+                raise RuntimeError(f"Couldn't find the tree of {parent}")
+            trees[parent] = GitTreeHash(found[0])
+
+        def is_empty(commit: git.CommitHeader) -> bool:
+            return commit.tree == trees[commit.parents[0]]
+
         to_pick = []
         for _, topic in self.topological_topics():
             this_topic = []
             topic_is_empty = True
             for commit in topic.original_commits:
                 this_topic.append(commit)
-                if not await self.git_ctx.have_identical_trees(commit.commit_id, commit.parents[0]):
+                if not is_empty(commit):
                     topic_is_empty = False
             # Drop empty topics, ie topics with all empty commits. git pull --rebase
             # doesn't automatically drop empty commits if they're been merged.
             if not topic_is_empty:
                 to_pick.extend(this_topic)
+        # Compare by id instead of comparing every field of each commit in to_pick
+        to_pick_ids = {commit.commit_id for commit in to_pick}
         no_topic = []
         for commit in self.commits:
-            if commit not in to_pick and not await self.git_ctx.have_identical_trees(
-                commit.commit_id, commit.parents[0]
-            ):
+            if commit.commit_id not in to_pick_ids and not is_empty(commit):
                 no_topic.append(commit)
 
         new_parent = self.commits[0].parents[0]
@@ -1413,27 +1658,24 @@ class TopicStack:
         await self.git_ctx.soft_reset(new_parent, git_env)
         return new_parent
 
-    def num_reviews_changed(self) -> int:
+    def any_reviews_changed(self) -> bool:
         """
-        Return the number of reviews that require some action (push / create / update).
-        This is similar to the logic that hides reviews in print() but different in some cases,
-        for example we take no action for merged prs but still print them out.
+        Return whether any review requires some action (push / create / update), stopping at the
+        first one that does. This is similar to the logic that hides reviews in print() but
+        different in some cases, for example we take no action for merged prs but still print
+        them out.
         """
-        ret = 0
-        for _, _, _, review in self.all_reviews_iter():
-            if (
-                review.status in (PrStatus.NOCHANGE, PrStatus.MERGED)
-                and review.push_status != PushStatus.PUSHED
-            ):
-                continue
-            ret += 1
-        return ret
+        return any(
+            review.push_status == PushStatus.PUSHED
+            or review.status not in (PrStatus.NOCHANGE, PrStatus.MERGED)
+            for _, _, _, review in self.all_reviews_iter()
+        )
 
     def print(self, skip_empty: bool) -> None:
         """
         Output a formatted version of whatever fields are currently populated.
         """
-        if skip_empty and self.num_reviews_changed() == 0:
+        if skip_empty and not self.any_reviews_changed():
             get_console().print("Nothing to upload! :rocket:")
             return
 
@@ -1446,7 +1688,8 @@ class TopicStack:
                 ):
                     continue
 
-                get_console().print("")
+                # Printed all at once, since each print has to render separately
+                lines = [""]
 
                 maybe_relative_topic = ""
                 if topic.relative_topic is not None:
@@ -1461,40 +1704,42 @@ class TopicStack:
                     maybe_relative_branch = f"[bold magenta]{review.relative_branch}[/] → "
                 maybe_draft = " (draft)" if review.is_draft else ""
 
-                get_console().print(
+                lines.append(
                     f"[green]Topic:[/] [bold cyan]{name}[/]{maybe_draft} →"
                     f" {maybe_relative_topic}{maybe_relative_branch}[bold"
                     f" red]{self.git_ctx.remove_branch_prefix(base)}[/]"
                 )
-                logging.debug(f"Base rev: {review.base_ref}")
-                if review.new_commits:
-                    logging.debug(f"New head: {review.new_commits[-1]}")
 
-                reviewers = topic.tags[TAG_REVIEWER]
-                assignees = topic.tags[TAG_ASSIGNEE]
-                labels = topic.tags[TAG_LABEL]
+                reviewers: Collection[str] = topic.tags[TAG_REVIEWER]
+                assignees: Collection[str] = topic.tags[TAG_ASSIGNEE]
+                labels: Collection[str] = topic.tags[TAG_LABEL]
                 if review.pr_info:
-                    reviewers = review.pr_info.reviewers
-                    assignees = review.pr_info.assignees
-                    labels = review.pr_info.labels
+                    reviewers = review.pr_info.reviewers.keys()
+                    assignees = review.pr_info.assignees.keys()
+                    labels = review.pr_info.labels.keys()
                 if reviewers:
-                    get_console().print(f"[green]Reviewers:[/] {', '.join(reviewers)}")
+                    lines.append(f"[green]Reviewers:[/] {', '.join(reviewers)}")
                 if assignees:
-                    get_console().print(f"[green]Assignees:[/] {', '.join(assignees)}")
+                    lines.append(f"[green]Assignees:[/] {', '.join(assignees)}")
                 if labels:
-                    get_console().print(f"[green]Labels:[/] {', '.join(labels)}")
-                get_console().print("[green]Commits:[/]")
+                    lines.append(f"[green]Labels:[/] {', '.join(labels)}")
+                lines.append("[green]Commits:[/]")
                 for i, commit in enumerate(topic.original_commits):
-                    title = commit.commit_msg.split("\n")[0]
+                    title = commit.commit_msg.partition("\n")[0]
                     if i == 0:
                         # Highlight the PR title
-                        get_console().print(f"  [bold green]{escape(title)}[/]")
+                        lines.append(f"  [bold green]{escape(title)}[/]")
                     else:
-                        get_console().print(f"  {escape(title)}")
+                        lines.append(f"  {escape(title)}")
                 if review.pr_info:
                     status_str = f"({review.status.value})"
                     if review.push_status != PushStatus.NOCHANGE:
                         # Push status is redundant if there's no change.
                         status_str += f" ({review.push_status.value})"
-                    get_console().print("[green]Github URL:[/]")
-                    get_console().print(f"  [underline]{review.pr_info.url}[/] {status_str}")
+                    lines.append("[green]Github URL:[/]")
+                    lines.append(f"  [underline]{review.pr_info.url}[/] {status_str}")
+                get_console().print("\n".join(lines))
+
+                logging.debug(f"Base rev: {review.base_ref}")
+                if review.new_commits:
+                    logging.debug(f"New head: {review.new_commits[-1]}")
@@ -1,5 +1,5 @@
 import argparse
-import subprocess
+import asyncio
 from typing import Optional
 
 from rich import get_console
@@ -48,7 +48,8 @@ async def main(
 
     if not args.dry_run and not args.push_only:
         with get_console().status("Querying github…"):
-            await topics.query_github()
+            # Local patch-ids don't depend on the query, so compute them while waiting on it
+            await asyncio.gather(topics.query_github(), topics.load_patch_ids())
             # Fetch uses the oid results from the query
             await topics.fetch_git_refs()
 
@@ -71,7 +72,7 @@ async def main(
 
     if not args.push_only:
         topics.populate_update_info(args.update_pr_body)
-    if not args.skip_confirm and topics.num_reviews_changed() > 0:
+    if not args.skip_confirm and topics.any_reviews_changed():
         topics.print(not args.verbose)
         if git_ctx.sh.wait_for_confirmation():
             return 1
@@ -79,17 +80,18 @@ async def main(
     if args.pre_upload:
         # Wait until we're sure there aren't any conflicts before running pre upload command
         with get_console().status("Running pre-upload command"):
-            result = subprocess.run(
+            # Run without blocking the event loop, so the status spinner keeps updating
+            proc = await asyncio.create_subprocess_shell(
                 args.pre_upload,
-                shell=True,
                 cwd=git_ctx.sh.cwd,
-                check=False,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                encoding="utf-8",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
             )
-            if result.returncode != 0:
-                raise RevupShellException(f"Pre-upload command failed:\n{result.stdout}")
+            stdout, _ = await proc.communicate()
+            if proc.returncode != 0:
+                raise RevupShellException(
+                    f"Pre-upload command failed:\n{stdout.decode(errors='backslashreplace')}"
+                )
 
     with get_console().status("Pushing remote branches…"):
         if args.patchsets:
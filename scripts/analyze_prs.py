@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 import argparse
+import collections
 import datetime
+import heapq
 import json
 
-import dateutil.parser
 import dateutil.relativedelta
 
+# PR dumps of large repos can be huge, so stream them with ijson if it is installed rather than
+# loading the whole document at once.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # A script for analyzing the revup usage within a particular repo. To use, first query github
 # with the command
 # gh pr list --state merged --json author --json headRefName --json mergedAt --json number --limit 20000 > pr_list.json
@@ -37,43 +45,39 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
 
-    text = open(args.filename).read()
-
-    all_prs = json.loads(text)
-
-    users = {}
-
-    total = 0
-    total_revup = 0
-
-    for pr in all_prs:
-        name = pr["author"]["login"]
-        if name not in users:
-            users[name] = [0, 0]
-
-        is_revup = "/revup/" in pr["headRefName"]
-
-        months_to_search = args.date_months
-        start_date = datetime.datetime.now() + dateutil.relativedelta.relativedelta(
-            months=-months_to_search
-        )
+    # Number of prs and revup prs per user, only counting prs within the date range
+    pr_counts = collections.Counter()
+    revup_pr_counts = collections.Counter()
 
-        dateat = dateutil.parser.parse(pr["mergedAt"])
-        date_in_range = start_date.timestamp() <= dateat.timestamp()
-
-        if args.limit_date and not date_in_range:
-            continue
-
-        total += 1
-        users[name][0] += 1
-        if is_revup:
-            total_revup += 1
-            users[name][1] += 1
-
-    # Delete users from the list with 0 prs
-    for user in list(users.keys()):
-        if users[user][0] == 0:
-            del users[user]
+    start_date = datetime.datetime.now() + dateutil.relativedelta.relativedelta(
+        months=-args.date_months
+    )
+    start_ts = start_date.timestamp()
+
+    with open(args.filename, "rb") as f:
+        all_prs = ijson.items(f, "item") if ijson is not None else json.load(f)
+        for pr in all_prs:
+            # Users are registered before the date check, so tied users keep being ranked in the
+            # order they first appear in the dump
+            name = pr["author"]["login"]
+            pr_counts.setdefault(name, 0)
+
+            # Github timestamps are always ISO 8601 in UTC, which the stdlib parser can handle
+            # once the "Z" suffix is spelled out
+            if args.limit_date and (
+                datetime.datetime.fromisoformat(pr["mergedAt"].replace("Z", "+00:00")).timestamp()
+                < start_ts
+            ):
+                continue
+
+            pr_counts[name] += 1
+            if "/revup/" in pr["headRefName"]:
+                revup_pr_counts[name] += 1
+
+    total = sum(pr_counts.values())
+    total_revup = sum(revup_pr_counts.values())
+    # Leave out users with no prs in the date range
+    users = [user for user, count in pr_counts.items() if count > 0]
     args.num_users = min(args.num_users, len(users))
 
     print("Total PRs: {}".format(total))
@@ -84,22 +88,22 @@ if __name__ == "__main__":
         )
     )
 
-    users_sorted = []
-    for user in users:
-        users_sorted.append((user, users[user][0], users[user][1]))
-
-    # Sort by revup prs and total prs. The arg sort_by_revup determines
-    # the order in which the sorts happen.
-    users_sorted.sort(key=lambda tup: tup[2 - args.sort_by_revup], reverse=True)
-    users_sorted.sort(key=lambda tup: tup[1 + args.sort_by_revup], reverse=True)
+    # Rank by revup prs and total prs. The arg sort_by_revup determines which is compared first.
+    # Only the top users are needed, so there's no need to sort everyone.
+    primary, secondary = (
+        (revup_pr_counts, pr_counts) if args.sort_by_revup else (pr_counts, revup_pr_counts)
+    )
+    top_users = heapq.nlargest(
+        args.num_users, users, key=lambda user: (primary[user], secondary[user])
+    )
 
-    for i in range(args.num_users):
+    for i, user in enumerate(top_users):
         print(
             "{}: {} with {} PRs and {} revup PRs ({:}%)".format(
                 i + 1,
-                users_sorted[i][0],
-                users_sorted[i][1],
-                users_sorted[i][2],
-                int(100.0 * users_sorted[i][2] / users_sorted[i][1]),
+                user,
+                pr_counts[user],
+                revup_pr_counts[user],
+                int(100.0 * revup_pr_counts[user] / pr_counts[user]),
             )
         )
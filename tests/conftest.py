@@ -0,0 +1,44 @@
+import asyncio
+import subprocess
+
+import pytest
+
+
+def _run_git(repo, *args: str) -> str:
+    return subprocess.run(["git", *args], cwd=repo, capture_output=True, check=True).stdout.decode()
+
+
+@pytest.fixture(name="run_git")
+def fixture_run_git():
+    """
+    Run git in the given repo and return its stdout, failing on errors.
+    """
+    return _run_git
+
+
+@pytest.fixture(name="git_repo")
+def fixture_git_repo(tmp_path):
+    """
+    An empty git repo with an identity configured for committing.
+    """
+    _run_git(tmp_path, "init", "-q")
+    _run_git(tmp_path, "config", "user.email", "test@example.com")
+    _run_git(tmp_path, "config", "user.name", "Test User")
+    return tmp_path
+
+
+@pytest.fixture(name="run_async")
+def fixture_run_async():
+    """
+    Run a coroutine to completion. A separate loop is used rather than asyncio.run(), which would
+    unset the default loop that other tests rely on.
+    """
+
+    def run(coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    return run
@@ -0,0 +1,121 @@
+import pytest
+
+from revup import git, shell
+
+BINARY_CONTENTS = bytes(range(256)) * 2 + b"\n\0\n"
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(git_repo, run_git):
+    (git_repo / "a b").write_text("spaced\n")
+    (git_repo / "empty").write_bytes(b"")
+    (git_repo / "binary").write_bytes(BINARY_CONTENTS)
+    run_git(git_repo, "add", ".")
+    run_git(git_repo, "commit", "-q", "-m", "First commit\n\nWith a body\n\n  and indentation  ")
+    run_git(git_repo, "commit", "-q", "--allow-empty", "--allow-empty-message", "-m", "")
+    return git_repo
+
+
+def make_git_ctx(repo) -> git.Git:
+    return git.Git(shell.Shell(cwd=str(repo)), "git", "origin", "main", "", False)
+
+
+def run_with_git(run_async, repo, func):
+    async def run():
+        git_ctx = make_git_ctx(repo)
+        try:
+            return await func(git_ctx)
+        finally:
+            await git_ctx.close()
+
+    return run_async(run())
+
+
+def test_cat_files(repo, run_async, run_git):
+    tree = run_git(repo, "rev-parse", "HEAD^{tree}").strip()
+    specs = [
+        "HEAD^{tree}",
+        "nonexist",
+        "HEAD:a b",
+        "HEAD:no such file",
+        "HEAD:empty",
+        "HEAD:binary",
+        "bad\nspec",
+        "HEAD:a b",
+    ]
+    results = run_with_git(run_async, repo, lambda git_ctx: git_ctx.cat_files(specs))
+
+    assert results[0] is not None and results[0][:2] == (tree, "tree")
+    assert results[1] is None
+    assert results[2] is not None and results[2][1:] == ("blob", b"spaced\n")
+    assert results[3] is None
+    assert results[4] is not None and results[4][1:] == ("blob", b"")
+    assert results[5] is not None and results[5][1:] == ("blob", BINARY_CONTENTS)
+    assert results[6] is None
+    assert results[7] == results[2]
+
+
+def test_cat_files_after_missing(repo, run_async):
+    # Missing objects mustn't leave unread output behind for later lookups on the same process
+    async def lookups(git_ctx):
+        first = await git_ctx.cat_files(["missing spec", "HEAD:missing path with spaces"])
+        second = await git_ctx.cat_file("HEAD:a b")
+        return first, second
+
+    first, second = run_with_git(run_async, repo, lookups)
+    assert first == [None, None]
+    assert second is not None and second[1:] == ("blob", b"spaced\n")
+
+
+def test_parse_commit_object(repo, run_async, run_git):
+    commit_ids = run_git(repo, "rev-list", "HEAD").split()
+    expected = git.parse_rev_list(run_git(repo, "rev-list", "--header", "HEAD"))
+
+    commits = run_with_git(run_async, repo, lambda git_ctx: git_ctx.get_commits(commit_ids))
+    assert commits == expected
+    assert commits[0].commit_msg == ""
+    assert commits[0].title == ""
+    assert commits[1].title == "First commit"
+    assert commits[1].commit_msg == "First commit\n\nWith a body\n\n  and indentation"
+    assert commits[0].parents == [commits[1].commit_id]
+    assert commits[1].author_name == "Test User"
+    assert commits[1].author_email == "test@example.com"
+
+
+def test_parse_latin1_commit(git_repo, run_async, run_git):
+    (git_repo / "msg").write_bytes("Caf\u00e9\n\nD\u00e9j\u00e0 vu\n".encode("latin-1"))
+    run_git(
+        git_repo, "-c", "i18n.commitEncoding=latin-1", "commit", "-q", "--allow-empty", "-F", "msg"
+    )
+    expected = git.parse_rev_list(run_git(git_repo, "rev-list", "--header", "HEAD"))
+
+    commits = run_with_git(run_async, git_repo, lambda git_ctx: git_ctx.get_commits(["HEAD"]))
+    assert commits == expected
+    assert commits[0].title == "Caf\u00e9"
+    assert commits[0].commit_msg == "Caf\u00e9\n\nD\u00e9j\u00e0 vu"
+
+
+def test_get_commits_missing(repo, run_async):
+    with pytest.raises(git.RevupUsageException):
+        run_with_git(run_async, repo, lambda git_ctx: git_ctx.get_commits(["HEAD", "nonexist"]))
+
+
+def test_best_base_branch_follows_moved_ref(git_repo, run_async, run_git):
+    # origin/feature is one commit ahead of origin/main, and HEAD starts at origin/feature
+    run_git(git_repo, "commit", "-q", "--allow-empty", "-m", "main")
+    run_git(git_repo, "update-ref", "refs/remotes/origin/main", "HEAD")
+    run_git(git_repo, "commit", "-q", "--allow-empty", "-m", "feature")
+    run_git(git_repo, "update-ref", "refs/remotes/origin/feature", "HEAD")
+
+    async def best_branches():
+        git_ctx = make_git_ctx(git_repo)
+        first = await git_ctx.get_best_base_branch_candidates("HEAD", False)
+        # Moving HEAD without clearing caches must give a fresh answer
+        run_git(git_repo, "reset", "-q", "--hard", "HEAD~")
+        second = await git_ctx.get_best_base_branch_candidates("HEAD", False)
+        return first, second, await git_ctx.get_best_base_branch("HEAD", False)
+
+    first, second, best = run_async(best_branches())
+    assert first == ("origin/feature",)
+    assert second == ("origin/feature", "origin/main")
+    assert best == "origin/main"
@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+
+from revup import git, shell
+from revup.topic_stack import Review, Topic, TopicStack
+from revup.types import GitCommitHash
+
+# Two identical blocks, so the same edit to either gives the same patch-id
+DUPLICATED_BLOCKS = "block\nx\ny\nz\n" * 2
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(git_repo, run_git):
+    """
+    A repo where "base" has a duplicated block, "remote" edits its second copy, and "local" and
+    "local_same" make an unrelated change and then edit the first or second copy respectively.
+    """
+    (git_repo / "f").write_text(DUPLICATED_BLOCKS)
+    (git_repo / "g").write_text("unrelated\n")
+    run_git(git_repo, "add", ".")
+    run_git(git_repo, "commit", "-q", "-m", "base")
+    run_git(git_repo, "branch", "base")
+
+    run_git(git_repo, "checkout", "-q", "-b", "remote", "base")
+    (git_repo / "f").write_text("block\nx\ny\nz\nblock\nX\ny\nz\n")
+    run_git(git_repo, "commit", "-q", "-am", "edit")
+
+    run_git(git_repo, "checkout", "-q", "-b", "other", "base")
+    (git_repo / "g").write_text("changed\n")
+    run_git(git_repo, "commit", "-q", "-am", "other")
+
+    run_git(git_repo, "checkout", "-q", "-b", "local", "other")
+    (git_repo / "f").write_text("block\nX\ny\nz\nblock\nx\ny\nz\n")
+    run_git(git_repo, "commit", "-q", "-am", "edit")
+
+    run_git(git_repo, "checkout", "-q", "-b", "local_same", "other")
+    (git_repo / "f").write_text("block\nx\ny\nz\nblock\nX\ny\nz\n")
+    run_git(git_repo, "commit", "-q", "-am", "edit")
+    return git_repo
+
+
+async def create_commits(repo, local_branch: str, mocker) -> tuple:
+    """
+    Create the commits for a review of local_branch's head on top of base, whose remote commit is
+    the head of remote. Returns the new commits and whether the merging cherry-pick was used.
+    """
+    git_ctx = git.Git(shell.Shell(cwd=str(repo)), "git", "origin", "main", "", False)
+    try:
+        local, remote = await git_ctx.get_commits([local_branch, "remote"])
+        local_patch_id, remote_patch_id = await git_ctx.get_patch_ids(
+            [local.commit_id, remote.commit_id]
+        )
+        # Patch-ids can't tell the two edits apart
+        assert local_patch_id == remote_patch_id
+
+        topic = Topic("topic", original_commits=[local], patch_ids=[local_patch_id])
+        review = Review(
+            topic,
+            base_ref=remote.parents[0],
+            remote_commits=[remote],
+            remote_patch_ids=[remote_patch_id],
+        )
+        synthetic_cherry_pick = mocker.patch.object(
+            git_ctx,
+            "synthetic_cherry_pick_from_commit",
+            return_value=GitCommitHash("cherry-picked"),
+        )
+        topics = TopicStack(git_ctx, "base", "base")
+        await topics.create_review_commits(
+            "topic", topic, "base", review, False, None, asyncio.Semaphore(1)
+        )
+        return review.new_commits, synthetic_cherry_pick.called
+    finally:
+        await git_ctx.close()
+
+
+def test_duplicated_hunk_not_reused(repo, run_async, mocker):
+    # The edit is to a different copy of the block, so the remote tree mustn't be reused
+    new_commits, cherry_picked = run_async(create_commits(repo, "local", mocker))
+    assert cherry_picked
+    assert new_commits == ["cherry-picked"]
+
+
+def test_matching_hunk_reused(repo, run_async, mocker, run_git):
+    new_commits, cherry_picked = run_async(create_commits(repo, "local_same", mocker))
+    assert not cherry_picked
+    assert run_git(repo, "rev-parse", f"{new_commits[0]}^{{tree}}") == run_git(
+        repo, "rev-parse", "remote^{tree}"
+    )
+
+
+def test_diff_fingerprints(repo, run_async, run_git):
+    async def fingerprints():
+        git_ctx = git.Git(shell.Shell(cwd=str(repo)), "git", "origin", "main", "", False)
+        commits = [
+            GitCommitHash(run_git(repo, "rev-parse", branch).strip())
+            for branch in ("local", "remote", "local_same", "other")
+        ]
+        return await git_ctx.get_diff_fingerprints(commits)
+
+    local, remote, local_same, other = run_async(fingerprints())
+    assert local != remote
+    assert local_same == remote
+    assert other not in (local, remote)
+
+
+# Expected results match the original line-by-line parser
+PARSE_COMMIT_TAGS_CASES = [
+    # No colon anywhere, so the message is returned as is
+    ("Title\n\nJust a body without tags", {}, "Title\n\nJust a body without tags"),
+    ("  Title only  ", {}, "Title only"),
+    ("", {}, ""),
+    (
+        "Title\n\nTopic: foo\nReviewers: a, b\nlabel: bug",
+        {"topic": {"foo"}, "reviewer": {"a", "b"}, "label": {"bug"}},
+        "Title",
+    ),
+    # Alternate spellings, including plurals of tags that are never plural
+    (
+        "Title\n\nTOPICS: foo\nAssignees: x\nBranches: main, origin/rel\nRelative-Branch: dev\n"
+        "update-pr-bodys: false\nbranch-formats: user",
+        {
+            "assignee": {"x"},
+            "branch": {"origin/main", "origin/rel"},
+            "relative-branch": {"origin/dev"},
+            "update-pr-body": {"false"},
+            "branch-format": {"user"},
+        },
+        "Title\n\nTOPICS: foo",
+    ),
+    (
+        "Title\n\nRelatives: x\nrelative: y\nTopic: z",
+        {"relative": {"y"}, "topic": {"z"}},
+        "Title\n\nRelatives: x",
+    ),
+    # Repeated tags are combined, and empty values dropped
+    (
+        "Title\n\nreviewer: a\nReviewers: b,c\nreviewer: a, , ",
+        {"reviewer": {"a", "b", "c"}},
+        "Title",
+    ),
+    # Tags mixed into the body
+    (
+        "Title\n\nSome text\nTopic: foo\nmore text\nLabels: x\nend",
+        {"topic": {"foo"}, "label": {"x"}},
+        "Title\n\nSome text\nmore text\nend",
+    ),
+    (
+        "Title\n\nNot-a-tag: value\nhttp://example.com\nTopic:foo",
+        {"topic": {"foo"}},
+        "Title\n\nNot-a-tag: value\nhttp://example.com",
+    ),
+    ("Title\n\n  Topic: indented\nTopic: real", {"topic": {"real"}}, "Title\n\n  Topic: indented"),
+    ("Topic: first\nTitle after", {"topic": {"first"}}, "Title after"),
+    ("Title\r\n\r\nTopic: foo\r\nbody", {"topic": {"foo"}}, "Title\r\n\r\nbody"),
+    (
+        "Title\n\nTopic: foo\n\n\nReviewer: a\n",
+        {"topic": {"foo"}, "reviewer": {"a"}},
+        "Title",
+    ),
+]
+
+
+@pytest.mark.parametrize("commit_msg,tags,trimmed_msg", PARSE_COMMIT_TAGS_CASES)
+def test_parse_commit_tags(commit_msg, tags, trimmed_msg):
+    git_ctx = git.Git(shell.Shell(), "git", "origin", "main", "", False)
+    topics = TopicStack(git_ctx, "base", "base")
+    assert topics.parse_commit_tags(commit_msg) == (tags, trimmed_msg)